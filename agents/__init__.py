@@ -3,5 +3,7 @@ from .executor import ExecutorAgent
 from .reviewer import ReviewerAgent
 from .runner import RunnerAgent
 from .monitor import MonitorAgent
+from .precheck import PrecheckAgent
+from .speculative import SpeculativeFixer
 
-__all__ = ['PlannerAgent', 'ExecutorAgent', 'ReviewerAgent', 'RunnerAgent', 'MonitorAgent']
+__all__ = ['PlannerAgent', 'ExecutorAgent', 'ReviewerAgent', 'RunnerAgent', 'MonitorAgent', 'PrecheckAgent', 'SpeculativeFixer']
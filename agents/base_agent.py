@@ -1,4 +1,4 @@
-from typing import Any, Dict, TypeVar, Generic
+from typing import Any, Dict, Optional, TypeVar, Generic
 from abc import ABC, abstractmethod
 import logging
 from langchain_core.messages import BaseMessage
@@ -28,3 +28,12 @@ class BaseAgent(ABC, Generic[StateType]):
         """Add a message to the state's message history."""
         messages = state.get("messages", [])
         return self.update_state(state, {"messages": messages + [message]})
+
+    def user_objective(self, state: StateType) -> Optional[str]:
+        """The user's original request: the first human message, not whatever message came last."""
+        for message in state.get("messages", []):
+            if isinstance(message, dict) and message.get("role") == "user":
+                return message["content"]
+            if getattr(message, "type", None) == "human":
+                return message.content
+        return None
@@ -0,0 +1,194 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+logger = logging.getLogger(__name__)
+
+FICLONE = 0x40049409  # Linux ioctl for copy-on-write clones (btrfs, xfs, ...)
+
+def _fsync_dir(path: Path) -> None:
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _reflink(src: Path, dst: Path) -> bool:
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            return True
+        except OSError:
+            return False
+
+def copy_file(src: Union[str, Path], dst: Union[str, Path]) -> None:
+    """Copy a file with its metadata, as a copy-on-write reflink where the filesystem supports it."""
+    if not _reflink(Path(src), Path(dst)):
+        shutil.copyfile(src, dst)
+    shutil.copystat(src, dst)
+
+def normalize_generated_text(content: str) -> str:
+    """
+    Convert literal "\\n" sequences to real newlines when the LLM escaped them twice.
+    Content that already has real newlines is left alone, and non-ASCII text survives.
+    """
+    if "\n" in content or "\\n" not in content:
+        return content
+    return content.encode("latin-1", "backslashreplace").decode("unicode_escape")
+
+class BlobStore:
+    """
+    Content-addressed store for generated file contents. Plans carry only the
+    sha256 of a file; identical contents across retries and sessions are stored once.
+
+    A blob's mtime records when it was last stored or materialized; blobs unused
+    for `max_age` are pruned, then the least recently used until the store fits
+    in `max_bytes`. Blobs used within `keep_recent` seconds are never pruned,
+    since a plan that is still running may need them.
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+        keep_recent: float = 3600.0,
+    ):
+        self.root = Path(root or os.getenv("BLOB_STORE_PATH", Path.home() / ".cache" / "codecraft" / "blobs"))
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("BLOB_STORE_MAX_BYTES", 1024 * 1024 * 1024))
+        self.max_age = max_age if max_age is not None else float(os.getenv("BLOB_STORE_MAX_AGE", 30 * 24 * 3600))
+        self.keep_recent = keep_recent
+        self.prune()
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:]
+
+    def exists(self, digest: str) -> bool:
+        return self.path(digest).exists()
+
+    def put(self, content: Union[str, bytes]) -> str:
+        """Store content durably and return its hash; a no-op if it is already stored."""
+        data = content.encode() if isinstance(content, str) else content
+        digest = hashlib.sha256(data).hexdigest()
+        target = self.path(digest)
+        if target.exists():
+            self._touch(target)
+            return digest
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, 0o444)
+            os.replace(tmp_path, target)
+            _fsync_dir(target.parent)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        return self.path(digest).read_bytes()
+
+    def materialize(self, digest: str, dest: Union[str, Path], hardlink: bool = False) -> bool:
+        """
+        Make `dest` hold the blob's content. Tries a reflink, then one streamed copy
+        (or a hardlink when asked for; the file then shares the read-only blob inode).
+        Returns False if `dest` already had identical content and was left untouched.
+        """
+        src, dest = self.path(digest), Path(dest)
+        if not src.exists():
+            raise FileNotFoundError(f"Blob {digest} not found in {self.root}")
+        self._touch(src)
+        if dest.is_file() and dest.stat().st_size == src.stat().st_size:
+            if hashlib.sha256(dest.read_bytes()).hexdigest() == digest:
+                return False
+
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.", suffix=".tmp")
+        os.close(fd)
+        tmp_path = Path(tmp_name)
+        try:
+            if hardlink:
+                tmp_path.unlink()
+                try:
+                    os.link(src, tmp_path)
+                except OSError:
+                    hardlink = False
+            if not hardlink:
+                if not _reflink(src, tmp_path):
+                    shutil.copyfile(src, tmp_path)
+                os.chmod(tmp_path, 0o644)
+                with open(tmp_path, "rb") as f:
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, dest)
+            _fsync_dir(dest.parent)
+        except BaseException:
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+        return True
+
+    def _touch(self, path: Path) -> None:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def prune(self) -> int:
+        """Delete blobs unused for `max_age`, then the least recently used beyond `max_bytes`; returns the count."""
+        blobs = []
+        for path in self.root.glob("??/*"):
+            if path.name.endswith(".tmp"):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            blobs.append((stat.st_mtime, stat.st_size, path))
+        blobs.sort()
+        total = sum(size for _, size, _ in blobs)
+
+        now = time.time()
+        removed = 0
+        for mtime, size, path in blobs:
+            if mtime >= now - self.keep_recent or (mtime >= now - self.max_age and total <= self.max_bytes):
+                break
+            try:
+                path.unlink()
+            except OSError as e:
+                logger.warning(f"Could not prune blob {path}: {e}")
+                continue
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"Pruned {removed} unused blob(s) from {self.root}")
+        return removed
+
+_default_store: Optional[BlobStore] = None
+_default_lock = threading.Lock()
+
+def get_blob_store() -> BlobStore:
+    """Process-wide store shared by the planner and executor."""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = BlobStore()
+        return _default_store
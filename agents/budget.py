@@ -0,0 +1,213 @@
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from langchain_core.messages import AIMessage
+from .logstore import get_log_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION = "default"
+
+# Session whose budget LLM calls are charged to; set around every tracked node
+current_session: contextvars.ContextVar[str] = contextvars.ContextVar("budget_session", default=DEFAULT_SESSION)
+
+class BudgetExceededError(Exception):
+    """Raised when an LLM call is attempted after a session's hard limit was reached."""
+
+class BudgetLimits:
+    """Hard limits per session; soft_ratio is the fraction after which cheaper strategies kick in."""
+
+    def __init__(
+        self,
+        max_seconds: Optional[float] = 900,
+        max_tokens: Optional[int] = 200_000,
+        max_iterations: Optional[int] = 8,
+        soft_ratio: float = 0.6,
+    ):
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.max_iterations = max_iterations
+        self.soft_ratio = soft_ratio
+
+    @classmethod
+    def from_env(cls) -> "BudgetLimits":
+        def limit(name: str, default: float, cast=float):
+            value = os.getenv(name)
+            if value is None:
+                return default
+            return cast(value) if float(value) > 0 else None
+
+        return cls(
+            max_seconds=limit("BUDGET_MAX_SECONDS", 900),
+            max_tokens=limit("BUDGET_MAX_TOKENS", 200_000, int),
+            max_iterations=limit("BUDGET_MAX_ITERATIONS", 8, int),
+            soft_ratio=float(os.getenv("BUDGET_SOFT_RATIO", 0.6)),
+        )
+
+class SessionUsage:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.tokens = 0
+        self.iterations = 0
+        self.node_seconds: Dict[str, float] = {}
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+class BudgetGovernor:
+    """
+    Tracks wall time, LLM tokens and planner iterations per session and turns
+    them into a mode: "normal", "economy" past the soft limit, "exhausted" past a hard one.
+    """
+
+    def __init__(self, limits: Optional[BudgetLimits] = None):
+        self.limits = limits or BudgetLimits.from_env()
+        self.sessions: Dict[str, SessionUsage] = {}
+        self.lock = threading.Lock()
+
+    def usage(self, session_id: str) -> SessionUsage:
+        with self.lock:
+            if session_id not in self.sessions:
+                self.sessions[session_id] = SessionUsage()
+            return self.sessions[session_id]
+
+    def end_session(self, session_id: str) -> None:
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def record_tokens(self, tokens: int, session_id: Optional[str] = None) -> None:
+        usage = self.usage(session_id or current_session.get())
+        with self.lock:
+            usage.tokens += tokens
+
+    def fraction_used(self, session_id: str) -> float:
+        """Largest used/limit ratio across the configured dimensions."""
+        usage = self.usage(session_id)
+        ratios = [0.0]
+        if self.limits.max_seconds:
+            ratios.append(usage.elapsed / self.limits.max_seconds)
+        if self.limits.max_tokens:
+            ratios.append(usage.tokens / self.limits.max_tokens)
+        if self.limits.max_iterations:
+            ratios.append(usage.iterations / self.limits.max_iterations)
+        return max(ratios)
+
+    def exhausted(self, session_id: str) -> bool:
+        """
+        Whether a hard limit is reached. The iteration that reaches max_iterations
+        may still plan; the graph stops before starting one more.
+        """
+        usage = self.usage(session_id)
+        limits = self.limits
+        return bool(
+            (limits.max_seconds and usage.elapsed >= limits.max_seconds)
+            or (limits.max_tokens and usage.tokens >= limits.max_tokens)
+            or (limits.max_iterations and usage.iterations > limits.max_iterations)
+        )
+
+    def iterations_left(self, session_id: str) -> Optional[int]:
+        if not self.limits.max_iterations:
+            return None
+        return max(self.limits.max_iterations - self.usage(session_id).iterations, 0)
+
+    def mode(self, session_id: str) -> str:
+        if self.exhausted(session_id):
+            return "exhausted"
+        if self.fraction_used(session_id) >= self.limits.soft_ratio:
+            return "economy"
+        return "normal"
+
+    def report(self, session_id: str) -> Dict[str, Any]:
+        usage = self.usage(session_id)
+        return {
+            "mode": self.mode(session_id),
+            "elapsed_seconds": round(usage.elapsed, 2),
+            "tokens": usage.tokens,
+            "iterations": usage.iterations,
+            "iterations_left": self.iterations_left(session_id),
+            "fraction_used": round(self.fraction_used(session_id), 3),
+            "node_seconds": {name: round(seconds, 2) for name, seconds in usage.node_seconds.items()},
+        }
+
+    def track(self, node_name: str, fn: Callable[[Dict[str, Any]], Dict[str, Any]], counts_iteration: bool = False):
+        """Wrap a graph node: charge its time to the session and publish the budget in the state."""
+
+        @functools.wraps(fn)
+        def wrapper(state: Dict[str, Any]) -> Dict[str, Any]:
+            session_id = state.get("session_id") or DEFAULT_SESSION
+            usage = self.usage(session_id)
+            if counts_iteration:
+                with self.lock:
+                    usage.iterations += 1
+            token = current_session.set(session_id)
+            # Agents read the mode from the state to pick cheaper strategies
+            state["budget"] = self.report(session_id)
+            start = time.monotonic()
+            try:
+                result = fn(state)
+            finally:
+                with self.lock:
+                    usage.node_seconds[node_name] = usage.node_seconds.get(node_name, 0.0) + time.monotonic() - start
+                current_session.reset(token)
+            if result is not None:
+                result["budget"] = self.report(session_id)
+            return result
+
+        return wrapper
+
+    def finish(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Terminal node: stop with a clear summary of what was achieved before the budget ran out."""
+        session_id = state.get("session_id") or DEFAULT_SESSION
+        report = self.report(session_id)
+        actions = state.get("plan", {}).get("actions", []) if isinstance(state.get("plan"), dict) else []
+        done = [a["description"] for a in actions if a.get("result") and a["result"].get("success")]
+        pending = [a["description"] for a in actions if not (a.get("result") and a["result"].get("success"))]
+        last_error = state["errors"][-1] if state.get("errors") else "none"
+
+        lines = [
+            "Stopped: budget exhausted "
+            f"({report['elapsed_seconds']}s, {report['tokens']} tokens, {report['iterations']} iterations).",
+            "Completed actions:" if done else "No actions completed.",
+            *[f"- {d}" for d in done],
+        ]
+        if pending:
+            lines += ["Not completed:", *[f"- {p}" for p in pending]]
+        lines.append(f"Last error: {get_log_store().tail(last_error, 1000)}")
+        logger.warning(lines[0])
+
+        state.setdefault("messages", []).append(AIMessage(content="\n".join(lines)))
+        state.update({"status": "budget_exhausted", "budget": report})
+        return state
+
+class BudgetedLLM:
+    """Wraps a chat model so every call is charged to the current session's token budget."""
+
+    def __init__(self, llm, governor: BudgetGovernor):
+        self.llm = llm
+        self.governor = governor
+
+    def invoke(self, input, **kwargs):
+        session_id = current_session.get()
+        if self.governor.mode(session_id) == "exhausted":
+            raise BudgetExceededError(f"Budget exhausted for session {session_id}")
+        response = self.llm.invoke(input, **kwargs)
+        usage = getattr(response, "usage_metadata", None) or {}
+        tokens = usage.get("total_tokens") or (len(str(input)) + len(str(getattr(response, "content", "")))) // 4
+        self.governor.record_tokens(tokens, session_id)
+        return response
+
+    def __getattr__(self, name: str):
+        return getattr(self.llm, name)
+
+def budget_mode(state: Dict[str, Any]) -> str:
+    return (state.get("budget") or {}).get("mode", "normal")
+
+def can_replan(state: Dict[str, Any]) -> bool:
+    """Whether the session's budget allows another planner iteration."""
+    budget = state.get("budget") or {}
+    return budget.get("mode") != "exhausted" and budget.get("iterations_left") != 0
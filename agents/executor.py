@@ -1,14 +1,36 @@
 from pathlib import Path
+import os
 import subprocess
-from typing import Dict, Any, Optional
-from .types import Plan, Action, ActionType, ActionResult, ValidationResult
+from typing import Dict, Any, List, Optional
+from .types import Plan, Action, ActionType, ActionResult
+from .blobstore import get_blob_store, normalize_generated_text
+from .logstore import get_log_store
+from .patching import confine_path
+from .prefetch import EnvironmentPrefetcher
+from .runner import python_executable
+from .validation import ValidationEngine
+from .venv_pool import VenvPool
+from .workspace import find_index
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Actions whose "path" param is created on disk, and context keys holding paths
+PATH_ACTIONS = (ActionType.CREATE_DIR, ActionType.CREATE_FILE, ActionType.CREATE_VENV)
+CONTEXT_PATH_KEYS = ("last_created_dir", "venv_path")
+
 class ExecutorAgent:
-    def __init__(self, llm):
+    def __init__(
+        self,
+        llm,
+        venv_pool: Optional[VenvPool] = None,
+        prefetcher: Optional[EnvironmentPrefetcher] = None,
+        validation: Optional[ValidationEngine] = None,
+    ):
         self.llm = llm
+        self.venv_pool = venv_pool
+        self.prefetcher = prefetcher
+        self.validation = validation or ValidationEngine()
         self.action_handlers = {
             ActionType.CREATE_DIR: self._handle_create_dir,
             ActionType.CREATE_FILE: self._handle_create_file,
@@ -21,28 +43,48 @@ class ExecutorAgent:
     def execute_plan(self, state: Dict[str, Any]) -> Dict[str, Any]:
         plan: Plan = state["plan"]
         context = plan["context"]
+
+        if context.get("workspace_root"):
+            try:
+                self._confine_to_workspace(plan, context["workspace_root"])
+            except ValueError as e:
+                logger.error(f"Rejected plan: {e}")
+                state.setdefault("errors", []).append(str(e))
+                return self.update_state(state, {
+                    "status": "error",
+                    "next": "monitoring"
+                })
         
-        # import pdb; pdb.set_trace()
         while True:
-            current_action = self._get_next_action(plan)
-            if not current_action:
+            # A wave is every pending action whose dependencies have already succeeded
+            wave = self._next_wave(plan)
+            if not wave:
                 break  # No more pending actions
 
-            try:
-                result = self._execute_action(current_action, context)
-                validation = self._validate_action(current_action, result)
-                
-                current_action["result"] = {
+            executed, failure = [], None
+            for action in wave:
+                try:
+                    executed.append((action, self._execute_action(action, context) or {}))
+                except Exception as e:
+                    failure = e
+                    break
+
+            # Validations of the wave run as one concurrent batch
+            validations = self.validation.validate_batch(executed, context)
+            for (action, result), validation in zip(executed, validations):
+                action["result"] = {
                     "success": validation["success"],
                     "output": result.get("output"),
                     "error": result.get("error"),
                     "validation": validation
                 }
-                
-                context.update(self._extract_context_updates(current_action))
-            except Exception as e:
-                logger.error(f"Action execution failed: {e}")
-                state.setdefault("errors", []).append(str(e))
+                if not validation["success"]:
+                    logger.warning(f"Validation failed for {action['description']}: {validation['message']}")
+                context.update(self._extract_context_updates(action))
+
+            if failure is not None:
+                logger.error(f"Action execution failed: {failure}")
+                state.setdefault("errors", []).append(get_log_store().append(str(failure)))
                 return self.update_state(state, {
                     "status": "error",
                     "next": "monitoring"
@@ -55,17 +97,35 @@ class ExecutorAgent:
             "next": "reviewer"
         })
 
-    def _get_next_action(self, plan: Plan) -> Optional[Action]:
-        """Find next action where all dependencies are completed successfully"""
+    def _confine_to_workspace(self, plan: Plan, root: str) -> None:
+        """
+        Keep every path the plan touches inside the session's workspace, so
+        concurrent sessions never share directories (or the caches keyed by them).
+        """
         for action in plan["actions"]:
-            if not action.get("result"):  # Not executed yet
-                dependencies_met = all(
-                    self._is_action_completed(plan, dep_id)
-                    for dep_id in action.get("dependencies", [])
+            params = action.get("params", {})
+            if action["type"] in PATH_ACTIONS and params.get("path"):
+                params["path"] = confine_path(root, params["path"])
+            validation = action.get("validation") or {}
+            if validation.get("type") in ("file_exists", "file_hash") and validation.get("criteria"):
+                criteria = validation["criteria"]
+                validation["criteria"] = (
+                    [confine_path(root, str(c)) for c in criteria] if isinstance(criteria, list)
+                    else confine_path(root, str(criteria))
                 )
-                if dependencies_met:
-                    return action
-        return None
+        for key in CONTEXT_PATH_KEYS:
+            if plan["context"].get(key):
+                plan["context"][key] = confine_path(root, plan["context"][key])
+
+    def _next_wave(self, plan: Plan) -> List[Action]:
+        """Actions not executed yet whose dependencies all completed successfully, in plan order"""
+        return [
+            action for action in plan["actions"]
+            if not action.get("result") and all(
+                self._is_action_completed(plan, dep_id)
+                for dep_id in action.get("dependencies", [])
+            )
+        ]
 
     def _is_action_completed(self, plan: Plan, action_id: str) -> bool:
         """Check if an action completed successfully"""
@@ -93,66 +153,74 @@ class ExecutorAgent:
     def _execute_action(self, action: Action, context: Dict[str, Any]) -> ActionResult:
         handler = self.action_handlers.get(ActionType(action["type"]))
         if handler:
-            return handler(action["params"])
+            return handler(action["params"], context)
         raise ValueError(f"Unknown action type: {action['type']}")
 
-    def _validate_action(self, action: Action, result: ActionResult) -> ValidationResult:
-        if not action.get("validation"):
-            return {"success": True}
-            
-        validation = action["validation"]
-        if validation["type"] == "file_exists":
-            success = Path(validation["criteria"]).exists()
-        elif validation["type"] == "command_output":
-            try:
-                subprocess.run(
-                    validation["criteria"],
-                    shell=True,
-                    check=True,
-                    capture_output=True
-                )
-                success = True
-            except subprocess.CalledProcessError:
-                success = False
-        else:
-            success = False
-        
-        return {"success": success, "message": validation.get("message", "")}
-
-    def _handle_create_dir(self, params: dict) -> ActionResult:
+    def _handle_create_dir(self, params: dict, context: Dict[str, Any]) -> ActionResult:
         path = Path(params["path"])
         path.mkdir(exist_ok=True, parents=True)
         logger.info(f"Created directory: {path}")
         return {"output": f"Created directory: {path}"}
 
-    def _handle_create_file(self, params: dict) -> ActionResult:
+    def _handle_create_file(self, params: dict, context: Dict[str, Any]) -> ActionResult:
         path = Path(params["path"])
-        path.parent.mkdir(exist_ok=True, parents=True)
-        # Convert literal "\n" sequences to actual newlines
-        content = params["content"].encode().decode("unicode_escape")
-        path.write_text(content)
-        # Allow filesystem update to complete
-        import time
-        time.sleep(0.1)
+        store = get_blob_store()
+        digest = params.get("content_hash")
+        if not digest:
+            # Plans built elsewhere may still inline the content
+            digest = store.put(normalize_generated_text(params["content"]))
+        # Written via temp file + fsync + rename, so the file is complete once this returns
+        written = store.materialize(digest, path)
+        index = find_index(path)
+        if index:
+            index.record(path)
+        if not written:
+            logger.info(f"File unchanged: {path}")
+            return {"output": f"File unchanged: {path}"}
         logger.info(f"Created file: {path}")
         return {"output": f"Created file: {path}"}
 
-    def _handle_create_venv(self, params: dict) -> ActionResult:
-        subprocess.run(["python", "-m", "venv", params["path"]], check=True)
+    def _handle_create_venv(self, params: dict, context: Dict[str, Any]) -> ActionResult:
+        if self.prefetcher and self.prefetcher.claim_venv(params["path"]):
+            pass
+        elif not (self.venv_pool and self.venv_pool.acquire(params["path"])):
+            subprocess.run(["python", "-m", "venv", params["path"]], check=True)
+        # Installs later in the same wave must already target this venv
+        context["venv_path"] = params["path"]
         logger.info(f"Created virtual environment: {params['path']}")
         return {"output": f"Created virtual environment: {params['path']}"}
 
-    def _handle_install_deps(self, params: dict) -> ActionResult:
-        subprocess.run(["pip", "install"] + params["packages"], check=True)
+    def _handle_install_deps(self, params: dict, context: Dict[str, Any]) -> ActionResult:
+        find_links = []
+        if self.prefetcher:
+            # A half-finished prefetch would race this install for the same wheels
+            self.prefetcher.wait_for_downloads(params["packages"])
+            find_links = self.prefetcher.install_args()
+        # The session's own venv, never the interpreter the assistant itself runs in
+        python_exec = python_executable(context.get("venv_path"))
+        python_exec = os.path.abspath(python_exec) if isinstance(python_exec, Path) else python_exec
+        subprocess.run(
+            [python_exec, "-m", "pip", "install"] + find_links + params["packages"],
+            cwd=self._working_dir(context),
+            check=True
+        )
         logger.info(f"Installed dependencies: {params['packages']}")
         return {"output": f"Installed dependencies: {params['packages']}"}
 
-    def _handle_run_command(self, params: dict) -> ActionResult:
-        subprocess.run(params["command"], shell=True, check=True)
+    def _handle_run_command(self, params: dict, context: Dict[str, Any]) -> ActionResult:
+        subprocess.run(params["command"], shell=True, cwd=self._working_dir(context), check=True)
         logger.info(f"Ran command: {params['command']}")
         return {"output": f"Ran command: {params['command']}"}
 
-    def _handle_custom_action(self, params: dict) -> ActionResult:
+    def _working_dir(self, context: Dict[str, Any]) -> Optional[str]:
+        """The session's workspace; None (our own cwd) outside the server."""
+        root = context.get("workspace_root")
+        if not root:
+            return None
+        os.makedirs(root, exist_ok=True)
+        return root
+
+    def _handle_custom_action(self, params: dict, context: Dict[str, Any]) -> ActionResult:
         if self.llm:
             # Use LLM to handle custom actions
             response = self.llm.invoke([{
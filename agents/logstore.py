@@ -0,0 +1,200 @@
+import logging
+import mmap
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Handles look like "logref:<segment>:<offset>:<length>" so they stay plain strings in the state
+LOGREF_RE = re.compile(r"^logref:([\w.\-]+):(\d+):(\d+)$")
+
+def is_log_ref(value) -> bool:
+    return isinstance(value, str) and LOGREF_RE.match(value) is not None
+
+class LogStore:
+    """
+    Append-only store for program output and error logs. Text is appended to
+    segment files and callers keep a short handle (segment, offset, length),
+    so states and checkpoints stay small however much a program prints.
+    Reads go through mmap and only touch the requested byte range.
+
+    Old segments are pruned by age and total size; a handle into a pruned
+    segment reads as a placeholder instead of failing.
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        segment_bytes: int = 64 * 1024 * 1024,
+        inline_chars: int = 512,
+        max_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+    ):
+        self.root = Path(root or os.getenv("LOG_STORE_PATH", Path.home() / ".cache" / "codecraft" / "logs"))
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.inline_chars = inline_chars
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("LOG_STORE_MAX_BYTES", 1024 * 1024 * 1024))
+        self.max_age = max_age if max_age is not None else float(os.getenv("LOG_STORE_MAX_AGE", 7 * 24 * 3600))
+        # Segments are never shared between processes, so appends need no file locking
+        self.prefix = f"{os.getpid()}-{int(time.time())}"
+        self.segment_number = 0
+        self.segment: Optional[Path] = None
+        self.maps: Dict[str, mmap.mmap] = {}
+        self.lock = threading.Lock()
+        self.prune()
+
+    def append(self, text: str) -> str:
+        """Store `text` and return its handle; short text is returned unchanged instead."""
+        if len(text) <= self.inline_chars:
+            return text
+        data = text.encode("utf-8", "surrogateescape")
+        with self.lock:
+            if self.segment is None or self.segment.stat().st_size + len(data) > self.segment_bytes:
+                self.segment_number += 1
+                self.segment = self.root / f"{self.prefix}-{self.segment_number:04d}.log"
+                self.segment.touch()
+                rotated = True
+            else:
+                rotated = False
+            with open(self.segment, "ab") as f:
+                offset = f.tell()
+                f.write(data)
+            handle = f"logref:{self.segment.name}:{offset}:{len(data)}"
+        if rotated:
+            self.prune()
+        return handle
+
+    def prune(self) -> int:
+        """
+        Delete segments older than `max_age`, then the oldest ones until the
+        store fits in `max_bytes`. The segment being appended to is kept.
+        Returns the number of segments deleted.
+        """
+        segments = []
+        for path in self.root.glob("*.log"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if path != self.segment:
+                segments.append((stat.st_mtime, stat.st_size, path))
+        segments.sort()
+        total = sum(size for _, size, _ in segments)
+        if self.segment is not None and self.segment.exists():
+            total += self.segment.stat().st_size
+
+        cutoff = time.time() - self.max_age
+        removed = 0
+        for mtime, size, path in segments:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError as e:
+                logger.warning(f"Could not prune log segment {path}: {e}")
+                continue
+            with self.lock:
+                # Live mappings stay readable after the unlink; new reads get the placeholder
+                self.maps.pop(path.name, None)
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"Pruned {removed} old log segment(s) from {self.root}")
+        return removed
+
+    def _view(self, handle: str) -> Optional[Tuple[mmap.mmap, int, int]]:
+        """The segment mapping and byte range a handle points to; None once the segment is gone."""
+        name, offset, length = LOGREF_RE.match(handle).groups()
+        offset, length = int(offset), int(length)
+        with self.lock:
+            mm = self.maps.get(name)
+            if mm is None or len(mm) < offset + length:
+                # The segment grew since it was mapped; remap to cover the new range.
+                # The old mapping is left to the GC since other readers may still hold it.
+                try:
+                    with open(self.root / name, "rb") as f:
+                        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError):
+                    return None
+                if len(mm) < offset + length:
+                    return None
+                self.maps[name] = mm
+        return mm, offset, length
+
+    @staticmethod
+    def _missing(handle: str) -> str:
+        return f"[log {handle} is no longer available]"
+
+    def read(self, value: str) -> str:
+        """Full text for a handle; anything else is returned as is."""
+        if not is_log_ref(value):
+            return value
+        view = self._view(value)
+        if view is None:
+            return self._missing(value)
+        mm, offset, length = view
+        return mm[offset:offset + length].decode("utf-8", "surrogateescape")
+
+    def head(self, value: str, max_bytes: int = 2000) -> str:
+        if not is_log_ref(value):
+            return value[:max_bytes]
+        view = self._view(value)
+        if view is None:
+            return self._missing(value)
+        mm, offset, length = view
+        return mm[offset:offset + min(length, max_bytes)].decode("utf-8", "ignore")
+
+    def tail(self, value: str, max_bytes: int = 2000) -> str:
+        if not is_log_ref(value):
+            return value[-max_bytes:]
+        view = self._view(value)
+        if view is None:
+            return self._missing(value)
+        mm, offset, length = view
+        end = offset + length
+        return mm[max(offset, end - max_bytes):end].decode("utf-8", "ignore")
+
+    def size(self, value: str) -> int:
+        if not is_log_ref(value):
+            return len(value.encode("utf-8", "surrogateescape"))
+        return int(LOGREF_RE.match(value).group(3))
+
+    def search(self, value: str, pattern: "re.Pattern[bytes]") -> Optional[re.Match]:
+        """Search a log in place; the regex runs over the mapping without copying the log."""
+        if not is_log_ref(value):
+            return pattern.search(value.encode("utf-8", "surrogateescape"))
+        view = self._view(value)
+        if view is None:
+            return None
+        mm, offset, length = view
+        return pattern.search(mm, offset, offset + length)
+
+    def preview(self, value: str, head_bytes: int = 1000, tail_bytes: int = 3000) -> str:
+        """Head and tail of a log for prompts, with the omitted middle summarized."""
+        size = self.size(value)
+        if size <= head_bytes + tail_bytes or (is_log_ref(value) and self._view(value) is None):
+            return self.read(value)
+        omitted = size - head_bytes - tail_bytes
+        return f"{self.head(value, head_bytes)}\n... [{omitted} bytes omitted] ...\n{self.tail(value, tail_bytes)}"
+
+    def close(self) -> None:
+        with self.lock:
+            for mm in self.maps.values():
+                mm.close()
+            self.maps.clear()
+
+_default_store: Optional[LogStore] = None
+_default_lock = threading.Lock()
+
+def get_log_store() -> LogStore:
+    """Process-wide store shared by the agents, the monitor and the server."""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = LogStore()
+        return _default_store
@@ -0,0 +1,190 @@
+import functools
+import logging
+import os
+import threading
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+logger = logging.getLogger(__name__)
+
+# Allocations made by the profiler itself or by imports are noise in per-node reports
+SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+DEFAULT_FIELD_LIMITS = {
+    "messages": 1024 * 1024,
+    "plan": 512 * 1024,
+    "errors": 256 * 1024,
+}
+
+class NodeMemory:
+    def __init__(self):
+        self.calls = 0
+        self.net_bytes = 0
+        self.peak_bytes = 0
+        self.top_sites: List[Dict[str, Any]] = []
+
+class MemoryProfiler:
+    """
+    Opt-in memory accounting per graph node. Each tracked node is bracketed
+    by tracemalloc snapshots whose difference gives its top allocation sites,
+    and the state it returns is serialized field by field, as the checkpointer
+    would, with warnings when a field or the whole state crosses its limit.
+
+    tracemalloc is process-wide, so when the server runs sessions concurrently
+    a node's numbers include allocations made by other sessions meanwhile.
+    """
+
+    def __init__(
+        self,
+        top: int = 10,
+        frames: int = 1,
+        field_limits: Optional[Dict[str, int]] = None,
+        default_field_limit: int = 256 * 1024,
+        state_limit: int = 4 * 1024 * 1024,
+        node_growth_limit: int = 16 * 1024 * 1024,
+    ):
+        self.top = top
+        self.frames = frames
+        self.field_limits = {**DEFAULT_FIELD_LIMITS, **(field_limits or {})}
+        self.default_field_limit = default_field_limit
+        self.state_limit = state_limit
+        self.node_growth_limit = node_growth_limit
+        self.serializer = JsonPlusSerializer()
+        self.nodes: Dict[str, NodeMemory] = {}
+        self.field_sizes: Dict[str, Dict[str, int]] = {}  # session id -> field -> serialized bytes
+        self.over_limit: Dict[str, set] = {}  # session id -> fields currently above their limit
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["MemoryProfiler"]:
+        """A profiler configured from MEMORY_PROFILE_* variables, or None unless MEMORY_PROFILE is set."""
+        if os.getenv("MEMORY_PROFILE", "").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            top=int(os.getenv("MEMORY_PROFILE_TOP", 10)),
+            frames=int(os.getenv("MEMORY_PROFILE_FRAMES", 1)),
+            default_field_limit=int(os.getenv("MEMORY_PROFILE_FIELD_LIMIT", 256 * 1024)),
+            state_limit=int(os.getenv("MEMORY_PROFILE_STATE_LIMIT", 4 * 1024 * 1024)),
+            node_growth_limit=int(os.getenv("MEMORY_PROFILE_NODE_LIMIT", 16 * 1024 * 1024)),
+        )
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+    def track(self, node_name: str, fn: Callable[[Dict[str, Any]], Dict[str, Any]]):
+        """Wrap a graph node with before/after snapshots and a state size check."""
+
+        @functools.wraps(fn)
+        def wrapper(state: Dict[str, Any]) -> Dict[str, Any]:
+            self.start()
+            before = self._snapshot()
+            tracemalloc.reset_peak()
+            start_current = tracemalloc.get_traced_memory()[0]
+            result = fn(state)
+            peak = tracemalloc.get_traced_memory()[1] - start_current
+            after = self._snapshot()
+            self._record_node(node_name, after.compare_to(before, "traceback" if self.frames > 1 else "lineno"), peak)
+            self.measure_state(node_name, {**state, **(result or {})})
+            return result
+
+        return wrapper
+
+    def _record_node(self, node_name: str, diff: List[tracemalloc.StatisticDiff], peak: int) -> None:
+        net = sum(stat.size_diff for stat in diff)
+        growing = sorted((stat for stat in diff if stat.size_diff > 0), key=lambda s: s.size_diff, reverse=True)
+        sites = [
+            {
+                "site": " <- ".join(f"{frame.filename}:{frame.lineno}" for frame in stat.traceback),
+                "size_diff": stat.size_diff,
+                "count_diff": stat.count_diff,
+            }
+            for stat in growing[:self.top]
+        ]
+        with self.lock:
+            memory = self.nodes.setdefault(node_name, NodeMemory())
+            memory.calls += 1
+            memory.net_bytes += net
+            memory.peak_bytes = max(memory.peak_bytes, peak)
+            memory.top_sites = sites
+
+        logger.debug(f"{node_name}: net {net / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB")
+        if net > self.node_growth_limit:
+            where = "\n".join(f"  {site['size_diff'] / 1024:.1f} KiB  {site['site']}" for site in sites)
+            logger.warning(f"{node_name} retained {net / 1024 / 1024:.1f} MiB; top allocation sites:\n{where}")
+
+    def field_size(self, value: Any) -> int:
+        try:
+            return len(self.serializer.dumps_typed(value)[1])
+        except Exception:
+            return len(repr(value).encode())
+
+    def measure_state(self, node_name: str, state: Dict[str, Any]) -> Dict[str, int]:
+        """Serialized size of each state field; warns when one crosses its limit."""
+        session_id = state.get("session_id") or "default"
+        sizes = {field: self.field_size(value) for field, value in state.items()}
+        total = sum(sizes.values())
+        with self.lock:
+            self.field_sizes[session_id] = sizes
+            over = self.over_limit.setdefault(session_id, set())
+            crossed = []
+            for field, size in [*sizes.items(), ("<state>", total)]:
+                limit = self.state_limit if field == "<state>" else self.field_limits.get(field, self.default_field_limit)
+                if size > limit and field not in over:
+                    over.add(field)
+                    crossed.append((field, size, limit))
+                elif size <= limit:
+                    over.discard(field)
+        # Warn on crossing rather than on every step, so a large field is reported once
+        for field, size, limit in crossed:
+            name = "state" if field == "<state>" else f"state field '{field}'"
+            logger.warning(
+                f"After {node_name}: {name} is {size / 1024:.1f} KiB (limit {limit / 1024:.1f} KiB) in session {session_id}"
+            )
+        return sizes
+
+    def end_session(self, session_id: str) -> None:
+        with self.lock:
+            self.field_sizes.pop(session_id, None)
+            self.over_limit.pop(session_id, None)
+
+    def report(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        with self.lock:
+            nodes = {
+                name: {
+                    "calls": memory.calls,
+                    "net_bytes": memory.net_bytes,
+                    "peak_bytes": memory.peak_bytes,
+                    "top_sites": memory.top_sites,
+                }
+                for name, memory in self.nodes.items()
+            }
+            fields = dict(self.field_sizes.get(session_id, {})) if session_id else {
+                sid: dict(sizes) for sid, sizes in self.field_sizes.items()
+            }
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        return {"traced_bytes": current, "traced_peak_bytes": peak, "nodes": nodes, "state_fields": fields}
+
+    def format_report(self, session_id: Optional[str] = None) -> str:
+        report = self.report(session_id)
+        lines = [f"Traced memory: {report['traced_bytes'] / 1024 / 1024:.1f} MiB"]
+        for name, node in sorted(report["nodes"].items(), key=lambda item: item[1]["net_bytes"], reverse=True):
+            lines.append(
+                f"{name}: {node['calls']} call(s), net {node['net_bytes'] / 1024:.1f} KiB, "
+                f"peak {node['peak_bytes'] / 1024:.1f} KiB"
+            )
+            lines += [f"  {site['size_diff'] / 1024:.1f} KiB  {site['site']}" for site in node["top_sites"][:3]]
+        if session_id and report["state_fields"]:
+            sizes = ", ".join(f"{field}={size}" for field, size in sorted(report["state_fields"].items()))
+            lines.append(f"State field sizes (bytes): {sizes}")
+        return "\n".join(lines)
@@ -1,18 +1,33 @@
 import logging
-from typing import Dict, Any
+import re
+from typing import Dict, Any, List, Optional
 from .base_agent import BaseAgent
+from .logstore import get_log_store
+from .plan_index import PlanIndex
 from langchain_core.messages import AIMessage  # Import AIMessage
 
 logger = logging.getLogger(__name__)
 
+ERROR_RE = re.compile(rb"error|exception", re.IGNORECASE)
+MODULE_NOT_FOUND_RE = re.compile(rb"modulenotfounderror", re.IGNORECASE)
+MISSING_MODULE_RE = re.compile(rb"No module named '([^']*)'")
+FILE_NOT_FOUND_RE = re.compile(rb"filenotfounderror", re.IGNORECASE)
+MISSING_FILE_RE = re.compile(rb"No such file or directory: '([^']*)'")
+NAME_ERROR_RE = re.compile(rb"nameerror", re.IGNORECASE)
+
 class MonitorAgent(BaseAgent):
-    def __init__(self, llm):
+    def __init__(self, llm, plan_index: Optional[PlanIndex] = None):
         self.llm = llm
+        self.plan_index = plan_index
 
     def run(self, state: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            log = state["errors"][-1] if state["errors"] else ""
-            recommendation = self.analyze_log(log)
+            if state.get("precheck_errors"):
+                recommendation = self.analyze_precheck(state["precheck_errors"])
+            else:
+                errors = state.get("errors")
+                log = errors[-1] if errors else ""
+                recommendation = self.analyze_log(log)
             state = self.add_message(
                 state,
                 AIMessage(content=f"Monitor recommendation: {recommendation}")
@@ -20,11 +35,14 @@ class MonitorAgent(BaseAgent):
             if recommendation != "no_error":
                 return self.update_state(state, {
                     "status": "retry",
+                    "recommendation": recommendation,
                     "next": "executor"
                 })
             else:
+                self._remember_plan(state)
                 return self.update_state(state, {
-                    "status": "completed"
+                    "status": "completed",
+                    "recommendation": recommendation
                 })
         except Exception as e:
             self.log_error(e, "log analysis")
@@ -33,24 +51,52 @@ class MonitorAgent(BaseAgent):
                 "errors": state.get("errors", []) + [str(e)]
             })
 
+    def _remember_plan(self, state: Dict[str, Any]) -> None:
+        """Index the plan that just succeeded under the user's original objective."""
+        plan = state.get("plan")
+        if not self.plan_index or not isinstance(plan, dict):
+            return
+        objective = self.user_objective(state)
+        if not objective:
+            return
+        try:
+            self.plan_index.add(objective, plan, state.get("context", {}).get("workspace_root"))
+        except (OSError, TypeError, ValueError) as e:
+            self.log_error(e, "plan indexing")
+
+    def analyze_precheck(self, errors: List[Dict[str, Any]]) -> str:
+        """Recommend the next step from structured static pre-check errors, most severe first."""
+        by_type = {error["type"]: error for error in reversed(errors)}
+        if "syntax_error" in by_type:
+            error = by_type["syntax_error"]
+            return f"fix_code:syntax_error:{error['file']}:{error['line']}"
+        if "unresolved_import" in by_type:
+            return f"install_module:{by_type['unresolved_import']['name']}"
+        if "undefined_name" in by_type:
+            return "fix_code:undefined_variable"
+        return "fix_code:general_error"
+
     def analyze_log(self, log: str) -> str:
         """
         Analyzes the log and recommends the next step.
-        Returns a command or action to take.
+        Returns a command or action to take. `log` may be a log store handle;
+        it is then searched in place instead of being loaded.
         """
-        log_lower = log.lower()
-        if "error" in log_lower or "exception" in log_lower:
+        store = get_log_store()
+        if store.search(log, ERROR_RE):
             logger.warning("Error detected in log.")
             # More specific recommendations:
-            if "modulenotfounderror" in log_lower:
-                module_name = log.split("No module named '")[-1].split("'")[0]
+            if store.search(log, MODULE_NOT_FOUND_RE):
+                match = store.search(log, MISSING_MODULE_RE)
+                module_name = match.group(1).decode() if match else ""
                 return f"install_module:{module_name}"  # Install missing module
-            elif "filenotfounderror" in log_lower:
-                file_path = log.split("No such file or directory: '")[-1].split("'")[0]
+            elif store.search(log, FILE_NOT_FOUND_RE):
+                match = store.search(log, MISSING_FILE_RE)
+                file_path = match.group(1).decode() if match else ""
                 return f"check_file_path:{file_path}"  # Check file path
-            elif "nameerror" in log_lower:
+            elif store.search(log, NAME_ERROR_RE):
                 return "fix_code:undefined_variable"  # Fix undefined variable
             else:
                 return "fix_code:general_error"  # General code error
         else:
-            return "no_error"
\ No newline at end of file
+            return "no_error"
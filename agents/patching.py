@@ -0,0 +1,190 @@
+import difflib
+import logging
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (path, search text, replacement text); an empty search text means "create the file"
+Edit = Tuple[str, str, str]
+
+SEARCH_REPLACE_RE = re.compile(
+    r"^(?P<path>[^\n`]+?)\s*\n(?:```[\w-]*\n)?<<<<<<< SEARCH\n(?P<search>.*?)^=======\n(?P<replace>.*?)^>>>>>>> REPLACE",
+    re.DOTALL | re.MULTILINE,
+)
+
+FUZZY_THRESHOLD = 0.9
+
+
+class PatchError(Exception):
+    """Raised when an edit cannot be located in the current file content."""
+
+
+def parse_edits(response: str) -> List[Edit]:
+    """Extract search/replace blocks or unified-diff hunks from an LLM response."""
+    edits = [
+        (m.group("path").strip().strip("`*#: "), m.group("search"), m.group("replace"))
+        for m in SEARCH_REPLACE_RE.finditer(response)
+    ]
+    return edits or _parse_unified_diff(response)
+
+
+def _parse_unified_diff(response: str) -> List[Edit]:
+    edits = []
+    path = None
+    search: List[str] = []
+    replace: List[str] = []
+    in_hunk = False
+
+    def flush():
+        if path and in_hunk and (search or replace):
+            edits.append((path, "".join(search), "".join(replace)))
+
+    for line in response.splitlines(keepends=True):
+        if line.startswith("+++ "):
+            flush()
+            in_hunk, search, replace = False, [], []
+            target = line[4:].strip().split("\t")[0]
+            path = target[2:] if target.startswith("b/") else target
+        elif line.startswith("--- "):
+            continue
+        elif line.startswith("@@"):
+            flush()
+            in_hunk, search, replace = True, [], []
+        elif in_hunk:
+            if line.startswith("```"):
+                flush()
+                in_hunk = False
+            elif line.startswith("-"):
+                search.append(line[1:])
+            elif line.startswith("+"):
+                replace.append(line[1:])
+            elif line.startswith(" ") or line in ("\n", "\r\n"):
+                context = line[1:] if line.startswith(" ") else line
+                search.append(context)
+                replace.append(context)
+    flush()
+    return edits
+
+
+def apply_edit(content: str, search: str, replace: str) -> str:
+    """
+    Replace `search` with `replace` in `content`.
+    Tries an exact match, then a whitespace-insensitive line match, then a fuzzy
+    line-window match; raises PatchError if none is unambiguous.
+    """
+    if not search.strip():
+        if content.strip():
+            raise PatchError("Empty search block for a non-empty file")
+        return replace
+
+    if content.count(search) == 1:
+        return content.replace(search, replace, 1)
+
+    lines = content.splitlines(keepends=True)
+    search_lines = search.splitlines(keepends=True)
+    span = _find_lines(lines, search_lines)
+    if span is None:
+        raise PatchError(f"Could not locate edit:\n{search[:200]}")
+
+    start, end = span
+    if replace and not replace.endswith("\n") and end < len(lines):
+        replace += "\n"
+    return "".join(lines[:start]) + replace + "".join(lines[end:])
+
+
+def _find_lines(lines: List[str], search_lines: List[str]) -> Optional[Tuple[int, int]]:
+    size = len(search_lines)
+    if size == 0 or size > len(lines):
+        return None
+
+    stripped = [line.strip() for line in search_lines]
+    matches = [
+        i for i in range(len(lines) - size + 1)
+        if [line.strip() for line in lines[i:i + size]] == stripped
+    ]
+    if len(matches) == 1:
+        return matches[0], matches[0] + size
+    if matches:
+        return None
+
+    target = "".join(stripped)
+    best, best_ratio, ambiguous = None, 0.0, False
+    for i in range(len(lines) - size + 1):
+        window = "".join(line.strip() for line in lines[i:i + size])
+        ratio = difflib.SequenceMatcher(None, window, target, autojunk=False).ratio()
+        if ratio > best_ratio:
+            best, best_ratio, ambiguous = i, ratio, False
+        elif ratio == best_ratio:
+            ambiguous = True
+    if best is None or best_ratio < FUZZY_THRESHOLD or ambiguous:
+        return None
+    logger.debug(f"Fuzzy-matched edit at line {best + 1} (ratio {best_ratio:.2f})")
+    return best, best + size
+
+
+def apply_edits(root: Path, edits: List[Edit]) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Apply edits to files under `root` in memory.
+    Returns (new contents of files that changed, errors by file); a file with any
+    failing edit is reported in errors and left out of the changes.
+    """
+    contents: Dict[str, str] = {}
+    originals: Dict[str, str] = {}
+    errors: Dict[str, str] = {}
+    for path, search, replace in edits:
+        if path in errors:
+            continue
+        if path not in contents:
+            file_path = root / path
+            if not is_within(root, file_path):
+                errors[path] = "Edit targets a path outside the project"
+                continue
+            originals[path] = file_path.read_text() if file_path.exists() else ""
+            contents[path] = originals[path]
+        try:
+            contents[path] = apply_edit(contents[path], search, replace)
+        except PatchError as e:
+            errors[path] = str(e)
+            contents.pop(path)
+
+    changed = {path: text for path, text in contents.items() if text != originals[path]}
+    return changed, errors
+
+
+def is_within(root: Path, path: Path) -> bool:
+    return root.resolve() in path.resolve().parents
+
+
+def confine_path(root: str, path: str) -> str:
+    """
+    `path` as a path inside `root`: paths already inside are kept, relative paths
+    outside are re-rooted under it. Raises ValueError for anything that would still escape.
+    """
+    root_path, candidate = Path(root), Path(path)
+    if candidate.resolve() == root_path.resolve() or is_within(root_path, candidate):
+        return path
+    if not candidate.is_absolute():
+        rerooted = root_path / candidate
+        if is_within(root_path, rerooted):
+            return str(rerooted)
+    raise ValueError(f"Path {path} is outside the workspace {root}")
+
+
+def write_atomic(path: Path, content: str) -> None:
+    """Write a file via a temporary sibling and rename, so readers never see a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        if path.exists():
+            os.chmod(tmp_path, path.stat().st_mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = ".plan_index.json"
+WORKSPACE_PLACEHOLDER = "{workspace_root}"
+MERSENNE_PRIME = (1 << 61) - 1
+
+STOPWORDS = frozenset(
+    "a an and are as at be build by can create for from in into is it make me of on or please "
+    "program simple so that the this to using which with write".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in STOPWORDS]
+
+def _substitute(value: Any, old: str, new: str) -> Any:
+    """Replace `old` with `new` in every string nested inside `value`."""
+    if isinstance(value, str):
+        return value.replace(old, new)
+    if isinstance(value, list):
+        return [_substitute(item, old, new) for item in value]
+    if isinstance(value, dict):
+        return {key: _substitute(item, old, new) for key, item in value.items()}
+    return value
+
+class PlanMatch:
+    def __init__(self, entry: Dict[str, Any], score: float):
+        self.entry = entry
+        self.score = score
+
+    @property
+    def objective(self) -> str:
+        return self.entry["objective"]
+
+    def instantiate(self, workspace_root: Optional[str]) -> Dict[str, Any]:
+        """The stored plan with its workspace placeholder pointed at `workspace_root`."""
+        plan = json.loads(json.dumps(self.entry["plan"]))
+        return _substitute(plan, WORKSPACE_PLACEHOLDER, workspace_root) if workspace_root else plan
+
+    def template(self, workspace_root: Optional[str] = None) -> str:
+        """Compact JSON of the plan's shape for a prompt: action types, params and descriptions only."""
+        actions = [
+            {
+                "type": action["type"],
+                "params": {key: value for key, value in action.get("params", {}).items() if key != "content_hash"},
+                "description": action.get("description", ""),
+            }
+            for action in self.instantiate(workspace_root)["actions"]
+        ]
+        return json.dumps(actions, separators=(",", ":"))
+
+class PlanIndex:
+    """
+    Local similarity index over objectives whose plans ran successfully.
+
+    MinHash signatures with LSH banding pick candidate objectives cheaply;
+    candidates are ranked by TF-IDF cosine similarity over objective words.
+    Entries are kept in a JSON file so recurring task shapes survive restarts.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        num_perm: int = 64,
+        bands: int = 32,
+        threshold: float = 0.5,
+        max_entries: int = 500,
+    ):
+        self.path = Path(path or os.getenv("PLAN_INDEX_PATH", DEFAULT_INDEX_PATH))
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.max_entries = max_entries
+        rng = random.Random(1201)  # fixed seed: signatures must stay comparable across runs
+        self.permutations = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(MERSENNE_PRIME)) for _ in range(num_perm)]
+        self.lock = threading.Lock()
+        self.entries: List[Dict[str, Any]] = self._load()
+        self._rebuild()
+
+    def _load(self) -> List[Dict[str, Any]]:
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("num_perm") == self.num_perm:
+                return data.get("entries", [])
+            logger.info(f"Plan index {self.path} uses different MinHash settings, starting empty")
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Ignoring unreadable plan index {self.path}: {e}")
+        return []
+
+    def _save(self) -> None:
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"num_perm": self.num_perm, "entries": self.entries}, f)
+        os.replace(tmp_path, self.path)
+
+    def _rebuild(self) -> None:
+        """Recompute LSH buckets and document frequencies from the entries."""
+        self.buckets: Dict[tuple, List[int]] = {}
+        self.doc_freq: Counter = Counter()
+        for i, entry in enumerate(self.entries):
+            for key in self._band_keys(entry["signature"]):
+                self.buckets.setdefault(key, []).append(i)
+            self.doc_freq.update(set(entry["tokens"]))
+
+    def signature(self, tokens: List[str]) -> List[int]:
+        hashes = [int.from_bytes(hashlib.blake2b(t.encode(), digest_size=8).digest(), "big") for t in set(tokens)]
+        if not hashes:
+            return [MERSENNE_PRIME] * self.num_perm
+        return [min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in self.permutations]
+
+    def _band_keys(self, signature: List[int]) -> List[tuple]:
+        return [(band, *signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def _tfidf(self, tokens: List[str]) -> Dict[str, float]:
+        n = len(self.entries)
+        counts = Counter(tokens)
+        vector = {t: c * (math.log((1 + n) / (1 + self.doc_freq[t])) + 1) for t, c in counts.items()}
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {t: v / norm for t, v in vector.items()}
+
+    def lookup(self, objective: str) -> Optional[PlanMatch]:
+        """The most similar stored objective, if it clears the similarity threshold."""
+        tokens = tokenize(objective)
+        if not tokens:
+            return None
+        with self.lock:
+            candidates = {i for key in self._band_keys(self.signature(tokens)) for i in self.buckets.get(key, [])}
+            if not candidates:
+                return None
+            query = self._tfidf(tokens)
+            best, best_score = None, 0.0
+            for i in candidates:
+                entry_vector = self._tfidf(self.entries[i]["tokens"])
+                score = sum(weight * entry_vector.get(t, 0.0) for t, weight in query.items())
+                if score > best_score:
+                    best, best_score = self.entries[i], score
+        if best is None or best_score < self.threshold:
+            return None
+        logger.info(f"Closest past objective ({best_score:.2f}): {best['objective']}")
+        return PlanMatch(best, best_score)
+
+    def add(self, objective: str, plan: Dict[str, Any], workspace_root: Optional[str] = None) -> None:
+        """Remember a plan that ran successfully; a previous plan for the same objective words is replaced."""
+        tokens = tokenize(objective)
+        if not tokens or not plan.get("actions"):
+            return
+        stored = {
+            "actions": [
+                {key: action.get(key) for key in ("type", "params", "description", "dependencies", "validation")}
+                for action in plan["actions"]
+            ],
+            "context": {k: v for k, v in plan.get("context", {}).items() if k != "workspace_root"},
+            "requirements": plan.get("requirements", []),
+            "estimated_time": plan.get("estimated_time", ""),
+        }
+        if workspace_root:
+            stored = _substitute(stored, workspace_root, WORKSPACE_PLACEHOLDER)
+        entry = {
+            "objective": objective,
+            "tokens": tokens,
+            "signature": self.signature(tokens),
+            "plan": json.loads(json.dumps(stored, default=str)),
+            "created": time.time(),
+        }
+        with self.lock:
+            token_set = set(tokens)
+            self.entries = [e for e in self.entries if set(e["tokens"]) != token_set]
+            self.entries.append(entry)
+            self.entries = self.entries[-self.max_entries:]
+            self._rebuild()
+            self._save()
@@ -1,6 +1,11 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from .base_agent import BaseAgent
 from .types import Plan, Action, ActionType, StepValidation
+from .blobstore import get_blob_store, normalize_generated_text
+from .budget import BudgetExceededError, budget_mode
+from .logstore import get_log_store
+from .plan_index import PlanIndex, PlanMatch
+from .prefetch import EnvironmentPrefetcher
 from langchain_core.messages import AIMessage
 import json
 import logging
@@ -9,14 +14,40 @@ import uuid
 logger = logging.getLogger(__name__)
 
 class PlannerAgent(BaseAgent):
+    def __init__(
+        self,
+        llm=None,
+        prefetcher: Optional[EnvironmentPrefetcher] = None,
+        plan_index: Optional[PlanIndex] = None,
+        reuse_threshold: float = 0.95,
+    ):
+        super().__init__(llm)
+        self.prefetcher = prefetcher
+        self.plan_index = plan_index
+        # Above this similarity a past plan is reused as is instead of prompting with it
+        self.reuse_threshold = reuse_threshold
+
     def run(self, state: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            messages = state["messages"]
-            objective = messages[-1].content
+            # On a replan the last message is the monitor's recommendation, not the task
+            objective = self.user_objective(state)
             context = state.get("context", {})
             
             if self.llm:
-                plan = self.create_plan(objective, context)
+                # Start creating the venv and downloading likely wheels while the LLM plans
+                job = self.prefetcher.start(objective, context) if self.prefetcher else None
+                feedback = self._replan_feedback(state)
+                match = self.plan_index.lookup(objective) if self.plan_index else None
+                plan = None
+                # A replan must change something, so a stored plan is then only a template
+                if match and match.score >= self.reuse_threshold and not feedback:
+                    plan = self._reuse_plan(match, objective, context)
+                if plan is None:
+                    plan = self.create_plan(
+                        objective, context, compact=budget_mode(state) != "normal", template=match, feedback=feedback
+                    )
+                if job:
+                    self.prefetcher.reconcile(job, plan)
                 state = self.add_message(
                     state,
                     AIMessage(content=self._format_plan_summary(plan))
@@ -25,9 +56,16 @@ class PlannerAgent(BaseAgent):
                     "plan": plan,
                     "status": "planning_completed",
                     "next": "executor",
-                    "context": plan["context"]
+                    "context": plan["context"],
+                    # Errors of the previous attempt are in the feedback; the new plan starts clean
+                    "errors": [],
+                    "precheck_errors": [],
                 })
             
+        except BudgetExceededError as e:
+            # The governor's refusal is not an error of the program; the graph stops here
+            logger.info(f"Not planning: {e}")
+            return self.update_state(state, {"status": "budget_exhausted"})
         except Exception as e:
             self.log_error(e, "plan creation")
             return self.update_state(state, {
@@ -36,10 +74,19 @@ class PlannerAgent(BaseAgent):
                 "next": "monitoring"
             })
 
-    def create_plan(self, objective: str, context: Dict[str, Any]) -> Plan:
+    def create_plan(
+        self,
+        objective: str,
+        context: Dict[str, Any],
+        compact: bool = False,
+        template: Optional[PlanMatch] = None,
+        feedback: Optional[str] = None,
+    ) -> Plan:
         logger.info(f"Creating plan for objective: {objective}")
         
-        prompt = self._create_planning_prompt(objective, context)
+        prompt = self._create_planning_prompt(
+            objective, self._compact_context(context) if compact else context, template, feedback
+        )
         
         if self.llm:
             try:
@@ -53,12 +100,40 @@ class PlannerAgent(BaseAgent):
                 ]
                 # Add context if not present
                 plan_dict["context"] = {**context, **plan_dict.get("context", {})}
+                plan_dict["objective"] = objective
                 plan_dict["status"] = "planning"
                 return Plan(**plan_dict)
+            except BudgetExceededError:
+                raise
             except Exception as e:
                 logger.error(f"Failed to create plan, falling back to default: {e}")
                 return e #self._create_default_plan(objective, context)
 
+    def _reuse_plan(self, match: PlanMatch, objective: str, context: Dict[str, Any]) -> Optional[Plan]:
+        """Instantiate a past plan for a near-identical objective without an LLM call."""
+        plan_dict = match.instantiate(context.get("workspace_root"))
+        blobs = get_blob_store()
+        hashes = [a["params"]["content_hash"] for a in plan_dict["actions"] if "content_hash" in a.get("params", {})]
+        if not all(blobs.exists(digest) for digest in hashes):
+            logger.info("Stored plan references file contents that are gone, planning from the template instead")
+            return None
+        logger.info(f"Reusing the plan of a past objective: {match.objective}")
+        actions = []
+        for action in plan_dict["actions"]:
+            if not action.get("validation"):
+                action.pop("validation", None)
+            actions.append(self._enhance_action(action))
+        return Plan(
+            objective=objective,
+            actions=actions,
+            context={**context, **plan_dict["context"]},
+            dependencies=[],
+            estimated_time=plan_dict.get("estimated_time", ""),
+            requirements=plan_dict.get("requirements", []),
+            status="planning",
+            current_step=None,
+        )
+
     def _parse_llm_response(self, content: str) -> Dict[str, Any]:
         """Parse and validate LLM response, cleaning it if necessary."""
         try:
@@ -103,6 +178,11 @@ class PlannerAgent(BaseAgent):
     def _enhance_action(self, action: Dict[str, Any]) -> Action:
         """Add ID and proper validation to an action"""
         action["id"] = str(uuid.uuid4())
+        if action["type"] == ActionType.CREATE_FILE and "content" in action.get("params", {}):
+            # Plans carry only the content hash; the text itself lives in the blob store
+            params = action["params"]
+            content = normalize_generated_text(params.pop("content"))
+            params["content_hash"] = get_blob_store().put(content)
         if "validation" not in action:
             action["validation"] = self._create_default_validation(action)
         action["result"] = None
@@ -129,7 +209,38 @@ class PlannerAgent(BaseAgent):
             "expected_result": True
         }
 
-    def _create_planning_prompt(self, objective: str, context: Dict[str, Any]) -> str:
+    def _compact_context(self, context: Dict[str, Any], max_value_chars: int = 200) -> Dict[str, Any]:
+        """Smaller prompt when the budget runs low: keep only short scalar context values."""
+        return {
+            key: value for key, value in context.items()
+            if isinstance(value, (str, int, float, bool)) and len(str(value)) <= max_value_chars
+        }
+
+    def _replan_feedback(self, state: Dict[str, Any]) -> Optional[str]:
+        """What went wrong last time, when the monitor sent us back here."""
+        recommendation = state.get("recommendation")
+        if not recommendation:
+            return None
+        last_error = state["errors"][-1] if state.get("errors") else ""
+        return f"Monitor recommendation: {recommendation}\nLast error:\n{get_log_store().tail(last_error, 1500)}"
+
+    def _create_planning_prompt(
+        self,
+        objective: str,
+        context: Dict[str, Any],
+        template: Optional[PlanMatch] = None,
+        feedback: Optional[str] = None,
+    ) -> str:
+        workspace_rule = ""
+        if context.get("workspace_root"):
+            workspace_rule = f"\n5. Create every file and directory inside {context['workspace_root']}"
+        feedback_section = f"\n\nThe previous attempt failed. Fix the cause:\n{feedback}" if feedback else ""
+        template_section = ""
+        if template:
+            template_section = (
+                f"\n\nA similar objective (\"{template.objective}\") was completed with these actions. "
+                f"Follow their structure and adapt names, paths and file contents:\n{template.template(context.get('workspace_root'))}"
+            )
         return f"""You are a software development planner. Create a detailed plan for this objective: {objective}
 
 IMPORTANT: Respond ONLY with a JSON object. Do not include any other text.
@@ -157,7 +268,7 @@ Remember:
 1. Return ONLY the JSON object
 2. Make sure all JSON is properly formatted
 3. Include at least one action
-4. All actions must have a valid type from the list provided"""
+4. All actions must have a valid type from the list provided{workspace_rule}{template_section}{feedback_section}"""
 
     def _format_plan_summary(self, plan: Plan) -> str:
         summary = [f"Objective: {plan['objective']}\n"]
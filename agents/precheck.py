@@ -0,0 +1,297 @@
+import ast
+import builtins
+import hashlib
+import json
+import logging
+import os
+import pkgutil
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+from .logstore import get_log_store
+from .runner import environment_signature, python_executable
+from .workspace import get_index
+
+logger = logging.getLogger(__name__)
+
+# Asks the target interpreter itself, so namespace packages and import hooks count too
+FIND_SPEC_SCRIPT = """
+import importlib.util, json, sys
+found = {}
+for name in sys.argv[1:]:
+    try:
+        found[name] = importlib.util.find_spec(name) is not None
+    except Exception:
+        found[name] = False
+print(json.dumps(found))
+"""
+
+MODULE_GLOBALS = {"__file__", "__name__", "__doc__", "__package__", "__spec__", "__loader__", "__builtins__", "__path__"}
+# Bound implicitly inside class bodies and methods
+CLASS_GLOBALS = {"__qualname__", "__module__", "__class__"}
+
+IMPORT_ERRORS = {"ImportError", "ModuleNotFoundError"}
+
+def _catches_import_error(handler: ast.ExceptHandler) -> bool:
+    if handler.type is None:
+        return True
+    types = handler.type.elts if isinstance(handler.type, ast.Tuple) else [handler.type]
+    for node in types:
+        name = node.attr if isinstance(node, ast.Attribute) else getattr(node, "id", None)
+        if name in IMPORT_ERRORS:
+            return True
+    return False
+
+def _is_type_checking(test: ast.expr) -> bool:
+    return (isinstance(test, ast.Name) and test.id == "TYPE_CHECKING") or (
+        isinstance(test, ast.Attribute) and test.attr == "TYPE_CHECKING"
+    )
+
+def optional_imports(tree: ast.AST) -> Set[int]:
+    """
+    ids of import nodes that may fail by design: those in a try body whose
+    handlers catch ImportError, and those under `if TYPE_CHECKING:`.
+    """
+    guarded: Set[int] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Try) or type(node).__name__ == "TryStar":
+            body = node.body if any(_catches_import_error(h) for h in node.handlers) else []
+        elif isinstance(node, ast.If) and _is_type_checking(node.test):
+            body = node.body
+        else:
+            continue
+        for statement in body:
+            guarded.update(id(child) for child in ast.walk(statement) if isinstance(child, (ast.Import, ast.ImportFrom)))
+    return guarded
+
+def check_source(rel_path: str, source: str, available_modules: FrozenSet[str]) -> List[Dict[str, Any]]:
+    """
+    Statically check one file: syntax, imports that cannot resolve, and names
+    that are never bound anywhere in the module. Runs in a worker process.
+    """
+    try:
+        tree = ast.parse(source, rel_path)
+        # Compiling the tree also catches symbol-table errors such as 'return' outside a function
+        compile(tree, rel_path, "exec", dont_inherit=True)
+    except SyntaxError as e:
+        return [{
+            "type": "syntax_error",
+            "file": rel_path,
+            "line": e.lineno,
+            "name": None,
+            "message": f"SyntaxError: {e.msg} ({rel_path}, line {e.lineno})"
+        }]
+
+    errors = []
+    bound = set(dir(builtins)) | MODULE_GLOBALS | CLASS_GLOBALS
+    guarded = optional_imports(tree)
+    star_import = False
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            if isinstance(node, ast.ImportFrom) and any(alias.name == "*" for alias in node.names):
+                star_import = True
+            modules = [alias.name for alias in node.names] if isinstance(node, ast.Import) else (
+                [node.module] if node.module and not node.level else []
+            )
+            if id(node) in guarded:
+                modules = []  # The program copes with this import failing
+            for module in modules:
+                top = module.split(".")[0]
+                if top not in available_modules:
+                    errors.append({
+                        "type": "unresolved_import",
+                        "file": rel_path,
+                        "line": node.lineno,
+                        "name": top,
+                        "message": f"ModuleNotFoundError: No module named '{top}' ({rel_path}, line {node.lineno})"
+                    })
+            for alias in node.names:
+                bound.add((alias.asname or alias.name).split(".")[0])
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+        elif isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            bound.add(node.id)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            bound.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            bound.update(node.names)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            bound.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            bound.add(node.rest)
+
+    if star_import:
+        # Anything could have come from the star import
+        return errors
+
+    # Conservative: a name is only reported if it is bound nowhere in the module
+    reported = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in bound:
+            if node.id in reported:
+                continue
+            reported.add(node.id)
+            errors.append({
+                "type": "undefined_name",
+                "file": rel_path,
+                "line": node.lineno,
+                "name": node.id,
+                "message": f"NameError: name '{node.id}' is not defined ({rel_path}, line {node.lineno})"
+            })
+    return errors
+
+def _site_modules(site_dirs: Iterable[Path]) -> Set[str]:
+    """
+    Top-level names in site directories: regular modules and packages, PEP 420
+    namespace packages (directories without __init__.py) and path entries added by .pth files.
+    """
+    names: Set[str] = set()
+    for site_dir in site_dirs:
+        paths = [str(site_dir)]
+        try:
+            entries = list(os.scandir(site_dir))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir() and entry.name.isidentifier():
+                names.add(entry.name)
+            elif entry.name.endswith(".pth"):
+                try:
+                    lines = Path(entry.path).read_text(errors="replace").splitlines()
+                except OSError:
+                    continue
+                for line in lines:
+                    line = line.strip()
+                    if line and not line.startswith(("#", "import ", "import\t")):
+                        paths.append(str(site_dir / line))
+        names.update(module.name for module in pkgutil.iter_modules(paths))
+    return names
+
+def available_modules(venv_path: Optional[str], project_path: str) -> FrozenSet[str]:
+    """Top-level module names importable by the project's interpreter, as far as a directory scan can tell."""
+    names = set(sys.builtin_module_names) | set(getattr(sys, "stdlib_module_names", ()))
+    if venv_path:
+        venv = Path(venv_path)
+        site_dirs = list(venv.glob("lib/python*/site-packages")) + list(venv.glob("Lib/site-packages"))
+        names.update(_site_modules(site_dirs))
+    else:
+        names.update(module.name for module in pkgutil.iter_modules())
+        names.update(_site_modules(Path(p) for p in sys.path if p and os.path.isdir(p)))
+
+    root = Path(project_path)
+    if root.is_dir():
+        # Local modules and packages, from the project root and any directory holding sources
+        dirs = {root} | {(root / rel).parent for rel in get_index(project_path).files(".py")}
+        names.update(module.name for module in pkgutil.iter_modules([str(d) for d in dirs]))
+    return frozenset(names)
+
+class PrecheckAgent:
+    """Compiles and AST-checks generated files in parallel before anything is run."""
+
+    def __init__(self, max_workers: Optional[int] = None, parallel_threshold: int = 4):
+        self.max_workers = max_workers or os.cpu_count()
+        self.parallel_threshold = parallel_threshold
+        self.cache: Dict[str, List[Dict[str, Any]]] = {}  # file + environment hash -> errors
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # (interpreter, environment signature, project) -> module name -> importable
+        self.spec_cache: Dict[Tuple, Dict[str, bool]] = {}
+
+    def run(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        plan = state.get("plan", {})
+        context = plan.get("context", {})
+        project_path = context.get("last_created_dir", ".")
+
+        try:
+            modules = available_modules(context.get("venv_path"), project_path)
+            errors = self.check_project(project_path, modules)
+            errors = self._confirm_unresolved(errors, context.get("venv_path"), project_path)
+        except Exception as e:
+            # A broken pre-check must not block the real run
+            logger.error(f"Static pre-check failed: {e}")
+            errors = []
+
+        if errors:
+            logger.warning(f"Static pre-check found {len(errors)} problem(s)")
+            state.setdefault("errors", []).append(get_log_store().append("\n".join(error["message"] for error in errors)))
+            state.update({"status": "error", "precheck_errors": errors})
+        else:
+            state.update({"precheck_errors": []})
+        return state
+
+    def check_project(self, project_path: str, modules: FrozenSet[str]) -> List[Dict[str, Any]]:
+        if not Path(project_path).is_dir():
+            return []
+        index = get_index(project_path)
+        env_hash = hashlib.sha256("\n".join(sorted(modules)).encode()).hexdigest()
+
+        errors: List[Dict[str, Any]] = []
+        pending = []
+        for rel_path in index.files(".py"):
+            # The index only rehashes files whose size or mtime changed
+            key = hashlib.sha256(f"{rel_path}\0{env_hash}\0{index.hash(rel_path)}".encode()).hexdigest()
+            if key in self.cache:
+                errors.extend(self.cache[key])
+            else:
+                source = (index.root / rel_path).read_text(errors="replace")
+                pending.append((key, rel_path, source))
+
+        if len(pending) >= self.parallel_threshold:
+            pool = self._get_pool()
+            futures = [pool.submit(check_source, rel_path, source, modules) for _, rel_path, source in pending]
+            results = [future.result() for future in futures]
+        else:
+            # Spinning up worker processes costs more than checking a handful of files
+            results = [check_source(rel_path, source, modules) for _, rel_path, source in pending]
+
+        for (key, _, _), result in zip(pending, results):
+            self.cache[key] = result
+            errors.extend(result)
+        logger.info(f"Pre-checked {len(pending)} file(s), {len(self.cache)} cached result(s)")
+        return errors
+
+    def _confirm_unresolved(
+        self, errors: List[Dict[str, Any]], venv_path: Optional[str], project_path: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Drop unresolved imports the target interpreter can in fact find (editable
+        installs, import hooks); one find_spec run per environment answers them all.
+        """
+        names = {error["name"] for error in errors if error["type"] == "unresolved_import"}
+        if not names:
+            return errors
+        python_exec = python_executable(venv_path)
+        key = (str(python_exec), environment_signature(python_exec), str(Path(project_path).resolve()))
+        known = self.spec_cache.setdefault(key, {})
+        missing = sorted(names - known.keys())
+        if missing:
+            try:
+                result = subprocess.run(
+                    # Absolute, since the venv path may be relative to our cwd rather than the project's
+                    [os.path.abspath(python_exec) if isinstance(python_exec, Path) else python_exec,
+                     "-c", FIND_SPEC_SCRIPT, *missing],
+                    cwd=project_path if Path(project_path).is_dir() else None,
+                    capture_output=True,
+                    text=True,
+                    timeout=30,
+                    check=True,
+                )
+                known.update(json.loads(result.stdout))
+            except (subprocess.SubprocessError, OSError, ValueError) as e:
+                # Without an answer, an import the scan could not see must not block the run
+                logger.warning(f"Could not confirm unresolved imports {missing}: {e}")
+                return [error for error in errors if error["type"] != "unresolved_import"]
+        return [error for error in errors if error["type"] != "unresolved_import" or not known.get(error["name"])]
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def close(self) -> None:
+        if self._pool:
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,265 @@
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+from .types import ActionType
+from .venv_pool import relocate_venv
+
+logger = logging.getLogger(__name__)
+
+# Library names as people write them in objectives -> pip distribution names
+KNOWN_PACKAGES = {
+    "aiohttp": "aiohttp",
+    "beautifulsoup": "beautifulsoup4",
+    "bs4": "beautifulsoup4",
+    "click": "click",
+    "django": "django",
+    "fastapi": "fastapi",
+    "flask": "flask",
+    "httpx": "httpx",
+    "matplotlib": "matplotlib",
+    "numpy": "numpy",
+    "opencv": "opencv-python",
+    "pandas": "pandas",
+    "pil": "pillow",
+    "pillow": "pillow",
+    "plotly": "plotly",
+    "pydantic": "pydantic",
+    "pytest": "pytest",
+    "pyyaml": "pyyaml",
+    "requests": "requests",
+    "rich": "rich",
+    "scikit-learn": "scikit-learn",
+    "scipy": "scipy",
+    "seaborn": "seaborn",
+    "sklearn": "scikit-learn",
+    "sqlalchemy": "sqlalchemy",
+    "streamlit": "streamlit",
+    "tqdm": "tqdm",
+    "typer": "typer",
+    "uvicorn": "uvicorn",
+    "yaml": "pyyaml",
+}
+
+def guess_packages(objective: str, context: Dict[str, Any]) -> List[str]:
+    """Packages the plan will probably install: libraries named in the objective plus known requirements."""
+    words = set(re.findall(r"[a-z][a-z0-9_\-]*", objective.lower()))
+    packages = {KNOWN_PACKAGES[word] for word in words if word in KNOWN_PACKAGES}
+    packages.update(str(req) for req in context.get("requirements", []) if isinstance(req, str))
+    return sorted(packages)
+
+def _normalize(name: str) -> str:
+    """Distribution name without version specifiers or extras, PEP 503 normalized."""
+    name = re.split(r"[\s\[<>=!~;]", name.strip(), maxsplit=1)[0]
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+class PrefetchJob:
+    """Speculative work started for one objective while the planner is still thinking."""
+
+    def __init__(self, venv_target: Optional[Path], packages: List[str], staging_dir: Optional[str] = None):
+        self.venv_target = venv_target  # None: an anonymous venv any planned path may claim
+        self.staging_dir = staging_dir
+        self.staging: Optional[Path] = None
+        self.packages = packages
+        self.venv_ready = threading.Event()
+        self.venv_ok = False
+        self.venv_process: Optional[subprocess.Popen] = None
+        self.download: Optional[subprocess.Popen] = None
+        self.cancelled = False
+
+class EnvironmentPrefetcher:
+    """
+    Overlaps environment preparation with the planner's LLM call: a venv is
+    created in a staging directory (next to venv_path when the context knows
+    it, otherwise as an anonymous spare), and wheels for libraries mentioned
+    in the objective are downloaded into a shared cache.
+    `reconcile` keeps what the final plan uses and discards the rest; `close`
+    discards whatever is still pending.
+    """
+
+    def __init__(self, wheel_dir: Optional[str] = None, python: str = "python", download_timeout: float = 300.0):
+        self.wheel_dir = Path(wheel_dir or os.getenv("WHEEL_CACHE_PATH", Path.home() / ".cache" / "codecraft" / "wheels"))
+        self.python = python
+        self.download_timeout = download_timeout
+        self.staged: List[PrefetchJob] = []  # jobs whose venv has not been claimed or discarded yet
+        self.downloads: List[PrefetchJob] = []  # jobs whose wheel download may still be running
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def start(self, objective: str, context: Dict[str, Any]) -> PrefetchJob:
+        venv_path = context.get("venv_path")
+        target = Path(venv_path).resolve() if venv_path else None
+        with self.lock:
+            if target and (target.exists() or any(job.venv_target == target for job in self.staged)):
+                # A replan whose venv already exists rarely creates another one
+                stage = False
+            else:
+                # One unclaimed anonymous venv is enough to serve the next plan
+                stage = target is not None or not any(job.venv_target is None for job in self.staged)
+            stage = stage and not self.closed
+            job = PrefetchJob(target, guess_packages(objective, context), context.get("workspace_root"))
+            if stage:
+                self.staged.append(job)
+
+        if stage:
+            threading.Thread(target=self._stage_venv, args=(job,), daemon=True, name="prefetch-venv").start()
+        else:
+            job.venv_ready.set()
+
+        if job.packages:
+            self.wheel_dir.mkdir(parents=True, exist_ok=True)
+            logger.info(f"Prefetching wheels while planning: {', '.join(job.packages)}")
+            job.download = subprocess.Popen(
+                [self.python, "-m", "pip", "download", "--quiet", "--dest", str(self.wheel_dir), *job.packages],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            with self.lock:
+                self.downloads = [j for j in self.downloads if j.download.poll() is None] + [job]
+        return job
+
+    def _stage_venv(self, job: PrefetchJob) -> None:
+        try:
+            if job.venv_target:
+                job.venv_target.parent.mkdir(parents=True, exist_ok=True)
+                job.staging = Path(tempfile.mkdtemp(prefix=f".{job.venv_target.name}.prefetch-", dir=job.venv_target.parent))
+            else:
+                if job.staging_dir:
+                    os.makedirs(job.staging_dir, exist_ok=True)
+                job.staging = Path(tempfile.mkdtemp(prefix=".venv.prefetch-", dir=job.staging_dir))
+            with self.lock:
+                if job.cancelled:
+                    return
+                # Kept on the job so close() can stop it; a finished venv would outlive the process
+                job.venv_process = subprocess.Popen(
+                    [self.python, "-m", "venv", "--clear", str(job.staging)],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE,
+                )
+            _, stderr = job.venv_process.communicate()
+            if job.venv_process.returncode != 0 and not job.cancelled:
+                raise subprocess.CalledProcessError(job.venv_process.returncode, job.venv_process.args, stderr=stderr)
+            job.venv_ok = job.venv_process.returncode == 0 and not job.cancelled
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.warning(f"Speculative venv creation failed: {e}")
+        finally:
+            job.venv_ready.set()
+            if job.cancelled:
+                self._discard_staging(job)
+
+    def reconcile(self, job: PrefetchJob, plan: Dict[str, Any]) -> None:
+        """Keep speculative work the plan needs; cancel and discard the rest."""
+        planned_venvs: Set[Path] = set()
+        planned_packages: Set[str] = set()
+        actions = plan.get("actions", []) if isinstance(plan, dict) else []
+        for action in actions:
+            params = action.get("params", {})
+            if action["type"] == ActionType.CREATE_VENV and params.get("path"):
+                planned_venvs.add(Path(params["path"]).resolve())
+            elif action["type"] == ActionType.INSTALL_DEPS:
+                planned_packages.update(_normalize(p) for p in params.get("packages", []))
+
+        with self.lock:
+            staged = job in self.staged
+        if staged and not planned_venvs:
+            logger.info("Plan creates no virtual environment, discarding speculative venv")
+            self._cancel_venv(job)
+        elif staged and job.venv_target and job.venv_target not in planned_venvs:
+            # Created for the wrong path, but still good for whichever path the plan chose
+            job.venv_target = None
+
+        if job.download and job.download.poll() is None:
+            if not planned_packages & {_normalize(p) for p in job.packages}:
+                logger.info("Plan installs none of the prefetched packages, stopping download")
+                job.download.kill()
+
+    def claim_venv(self, path: str) -> bool:
+        """
+        Move a staged venv to `path` for the executor: the one staged for that
+        path, else an anonymous one. False when there is none to use or `path` exists.
+        """
+        target = Path(path).resolve()
+        if target.exists():
+            return False
+        with self.lock:
+            job = next((j for j in self.staged if j.venv_target == target), None)
+            job = job or next((j for j in self.staged if j.venv_target is None), None)
+            if job is None:
+                return False
+            self.staged.remove(job)
+        job.venv_ready.wait()
+        if not job.venv_ok or job.staging is None:
+            self._discard_staging(job)
+            return False
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(job.staging), str(target))
+            relocate_venv(job.staging, target)
+        except OSError as e:
+            logger.warning(f"Could not move speculative venv to {target}: {e}")
+            self._discard_staging(job)
+            return False
+        logger.info(f"Using speculatively created virtual environment at {target}")
+        return True
+
+    def wait_for_downloads(self, packages: List[str]) -> None:
+        """Block until prefetch downloads of any of `packages` finish, so pip never sees partial wheels."""
+        wanted = {_normalize(p) for p in packages}
+        with self.lock:
+            running = [
+                job for job in self.downloads
+                if job.download.poll() is None and wanted & {_normalize(p) for p in job.packages}
+            ]
+        for job in running:
+            logger.info(f"Waiting for prefetch of {', '.join(job.packages)} to finish")
+            try:
+                job.download.wait(timeout=self.download_timeout)
+            except subprocess.TimeoutExpired:
+                logger.warning(f"Prefetch of {', '.join(job.packages)} timed out, stopping it")
+                job.download.kill()
+                job.download.wait()
+        with self.lock:
+            self.downloads = [job for job in self.downloads if job.download.poll() is None]
+
+    def install_args(self) -> List[str]:
+        """Extra pip install arguments that let prefetched wheels satisfy the install."""
+        if self.wheel_dir.is_dir():
+            return ["--find-links", str(self.wheel_dir)]
+        return []
+
+    def close(self) -> None:
+        """Stop pending downloads and venv creation and delete staged venvs nobody claimed."""
+        with self.lock:
+            self.closed = True
+            staged, self.staged = self.staged, []
+            downloads, self.downloads = self.downloads, []
+            for job in staged:
+                job.cancelled = True
+        for job in downloads:
+            if job.download.poll() is None:
+                job.download.kill()
+                job.download.wait()
+        for job in staged:
+            if job.venv_process and job.venv_process.poll() is None:
+                job.venv_process.kill()
+            job.venv_ready.wait(timeout=10)
+            self._discard_staging(job)
+        if staged:
+            logger.info(f"Discarded {len(staged)} unused speculative venv(s)")
+
+    def _cancel_venv(self, job: PrefetchJob) -> None:
+        with self.lock:
+            if job in self.staged:
+                self.staged.remove(job)
+        job.cancelled = True
+        if job.venv_ready.is_set():
+            self._discard_staging(job)
+
+    def _discard_staging(self, job: PrefetchJob) -> None:
+        if job.staging and job.staging.exists():
+            shutil.rmtree(job.staging, ignore_errors=True)
@@ -1,64 +1,221 @@
+import ast
+import contextvars
+import hashlib
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from .budget import budget_mode
+from .logstore import get_log_store
+from .patching import apply_edits, is_within, parse_edits, write_atomic
+from .workspace import get_index
 
 logger = logging.getLogger(__name__)
 
+class CodeChunk:
+    """A reviewable piece of a file: the whole file, or a run of top-level statements."""
+
+    def __init__(self, path: str, name: str, start: int, end: int, source: str):
+        self.path = path
+        self.name = name
+        self.start = start
+        self.end = end
+        self.source = source
+        self.hash = hashlib.sha256(f"{path}:{name}\n{source}".encode()).hexdigest()
+
 class ReviewerAgent:
-    def __init__(self, llm):
+    def __init__(self, llm, max_chunk_lines: int = 150, max_workers: int = 4, cache_dir: Optional[str] = None):
         self.llm = llm
+        self.max_chunk_lines = max_chunk_lines
+        self.max_workers = max_workers
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.review_cache: Dict[str, str] = {}  # chunk hash -> review
+        self.last_snapshot: Dict[str, int] = {}  # project path -> workspace snapshot id
 
     def review_and_refine(self, state: dict) -> dict:
         plan = state.get("plan", {})
         context = plan.get("context", {})
         project_path = context.get("last_created_dir", "project")
         logger.info(f"Reviewing code in {project_path}")
-        
+        if budget_mode(state) != "normal":
+            logger.info("Budget running low, skipping code review")
+            return state
+
         try:
-            # Try main.py; if not present, fall back to last_created_file from context
-            main_path = Path(project_path) / "main.py"
-            if not main_path.exists():
-                alt = context.get("last_created_file", "")
-                main_path = Path(project_path) / alt if alt else main_path
-            test_path = Path(project_path) / "test_sum_even_numbers.py"
-            
-            main_code = self._read_file(main_path)
-            test_code = self._read_file(test_path)
-            
-            if self.llm:
-                # Use invoke instead of chat
-                review = self.llm.invoke([{
-                    "role": "user",
-                    "content": f"Review this Python code:\n\n{main_code}\n\nTests:\n{test_code}"
-                }]).content
+            if not Path(project_path).is_dir():
+                logger.info(f"Project directory {project_path} does not exist, nothing to review")
+                return state
+            index = get_index(project_path)
+            previous = self.last_snapshot.get(project_path)
+            changed = sorted(
+                path for path, change in index.changed_since(previous).items()
+                if change != "removed" and path.endswith(".py")
+            )
+            if not changed:
+                logger.info("No changes since last review, skipping")
+                return state
+
+            chunks = [chunk for path in changed for chunk in self._chunk_file(project_path, path)]
+            pending = [chunk for chunk in chunks if self._cached_review(chunk) is None]
+            logger.info(
+                f"Reviewing {len(changed)} changed file(s): "
+                f"{len(pending)} of {len(chunks)} chunk(s) not reviewed before"
+            )
+
+            if self.llm and pending:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                    # Each worker runs in a copy of this context so its LLM calls are charged to the session
+                    futures = [pool.submit(contextvars.copy_context().run, self._review_chunk, chunk) for chunk in pending]
+                    for chunk, future in zip(pending, futures):
+                        self._store_review(chunk, future.result())
+
+                review = "\n\n".join(
+                    f"### {chunk.path} ({chunk.name}, lines {chunk.start}-{chunk.end})\n{self._cached_review(chunk)}"
+                    for chunk in pending
+                )
                 logger.info(f"Code review results:\n{review}")
-                self._implement_suggestions(review, project_path)
+                self._implement_suggestions(review, project_path, pending)
                 state.setdefault("messages", []).append(
                     {"role": "system", "content": f"Reviewer comments: {review}"}
                 )
+
+            # Suggestions may have rewritten files; the next review diffs against what is on disk now
+            self.last_snapshot[project_path] = index.snapshot()
+            if previous:
+                index.release(previous)
             return state
 
         except Exception as e:
             logger.error(f"Error during code review: {e}")
-            state.setdefault("errors", []).append(str(e))
+            state.setdefault("errors", []).append(get_log_store().append(str(e)))
             return state
 
-    def _implement_suggestions(self, review: str, project_path: str):
-        """Implement suggestions from the code review."""
-        if self.llm:
-            prompt = f"""
-            Based on this review:
-            {review}
-            
-            Generate the improved version of the code that implements these suggestions.
-            Return only the improved code without explanations.
-            """
-            try:
-                # Remove unsupported assistant_name parameter
-                improved_code = self.llm.invoke(prompt)
-                if improved_code:
-                    self._write_improved_code(improved_code, project_path)
-            except Exception as e:
-                logger.error(f"Error implementing suggestions: {e}")
+    def _chunk_file(self, project_path: str, rel_path: str) -> List[CodeChunk]:
+        """Split a file into AST-level chunks; small files are reviewed whole."""
+        source = self._read_file(Path(project_path) / rel_path)
+        lines = source.splitlines()
+        if len(lines) <= self.max_chunk_lines:
+            return [CodeChunk(rel_path, "module", 1, len(lines), source)]
+
+        try:
+            tree = ast.parse(source)
+        except SyntaxError:
+            return self._chunk_lines(rel_path, lines)
+
+        # Group consecutive top-level statements into chunks of at most max_chunk_lines,
+        # so an edit to one function only invalidates the chunk that contains it
+        chunks = []
+        group: List[Tuple[str, int, int]] = []
+        for node in tree.body:
+            start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+            name = getattr(node, "name", None) or "module-level code"
+            if group and node.end_lineno - group[0][1] + 1 > self.max_chunk_lines:
+                chunks.append(self._make_chunk(rel_path, lines, group))
+                group = []
+            group.append((name, start, node.end_lineno))
+        if group:
+            chunks.append(self._make_chunk(rel_path, lines, group))
+        return chunks
+
+    def _make_chunk(self, rel_path: str, lines: List[str], group: List[Tuple[str, int, int]]) -> CodeChunk:
+        names = list(dict.fromkeys(name for name, _, _ in group))
+        start, end = group[0][1], group[-1][2]
+        return CodeChunk(rel_path, ", ".join(names), start, end, "\n".join(lines[start - 1:end]))
+
+    def _chunk_lines(self, rel_path: str, lines: List[str]) -> List[CodeChunk]:
+        """Fallback for files that do not parse: fixed windows of lines."""
+        chunks = []
+        for start in range(0, len(lines), self.max_chunk_lines):
+            window = lines[start:start + self.max_chunk_lines]
+            end = start + len(window)
+            chunks.append(CodeChunk(rel_path, f"lines {start + 1}-{end}", start + 1, end, "\n".join(window)))
+        return chunks
+
+    def _review_chunk(self, chunk: CodeChunk) -> str:
+        return self.llm.invoke([{
+            "role": "user",
+            "content": (
+                f"Review this Python code from {chunk.path} ({chunk.name}, lines {chunk.start}-{chunk.end}):"
+                f"\n\n{chunk.source}"
+            )
+        }]).content
+
+    def _cached_review(self, chunk: CodeChunk) -> Optional[str]:
+        review = self.review_cache.get(chunk.hash)
+        if review is None and self.cache_dir:
+            cache_file = self.cache_dir / f"{chunk.hash}.txt"
+            if cache_file.exists():
+                review = cache_file.read_text()
+                self.review_cache[chunk.hash] = review
+        return review
+
+    def _store_review(self, chunk: CodeChunk, review: str) -> None:
+        self.review_cache[chunk.hash] = review
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            (self.cache_dir / f"{chunk.hash}.txt").write_text(review)
+
+    def _implement_suggestions(self, review: str, project_path: str, chunks: List[CodeChunk]):
+        """Apply the review's suggestions as targeted edits, rewriting whole files only as a fallback."""
+        if not self.llm:
+            return
+        code = "\n\n".join(f"{chunk.path} (lines {chunk.start}-{chunk.end}):\n{chunk.source}" for chunk in chunks)
+        prompt = f"""Based on this review:
+{review}
+
+of this code:
+{code}
+
+Implement the suggestions as search/replace edits, one block per change, in this exact format:
+
+path/relative/to/project.py
+<<<<<<< SEARCH
+exact lines currently in the file
+=======
+replacement lines
+>>>>>>> REPLACE
+
+Keep each SEARCH section short but unique within its file. Return only the edit blocks; return nothing if no change is needed."""
+        try:
+            response = self.llm.invoke([{"role": "user", "content": prompt}]).content
+            edits = parse_edits(response)
+            if not edits:
+                logger.info("Reviewer proposed no edits")
+                return
+
+            root = Path(project_path)
+            changed, failed = apply_edits(root, edits)
+            for path, error in failed.items():
+                if not (root / path).is_file() or not is_within(root, root / path):
+                    logger.warning(f"Skipping edits for {path}: {error}")
+                    continue
+                logger.warning(f"Patch for {path} did not apply ({error}), falling back to full rewrite")
+                rewritten = self._rewrite_file(root / path, review)
+                if rewritten is not None:
+                    changed[path] = rewritten
+
+            for path, content in changed.items():
+                write_atomic(root / path, content)
+                logger.info(f"Applied review suggestions to {path}")
+        except Exception as e:
+            logger.error(f"Error implementing suggestions: {e}")
+
+    def _rewrite_file(self, path: Path, review: str) -> Optional[str]:
+        """Ask for a complete new version of a single file; used when its patch fails."""
+        current = self._read_file(path)
+        response = self.llm.invoke([{
+            "role": "user",
+            "content": (
+                f"Based on this review:\n{review}\n\nGenerate the improved version of {path.name}:\n\n{current}\n\n"
+                "Return only the complete improved code without explanations."
+            )
+        }]).content
+        match = re.search(r"```(?:python)?\n(.*?)```", response, re.DOTALL)
+        improved = match.group(1) if match else response
+        if not improved.strip() or improved == current:
+            return None
+        return improved
 
     def _read_file(self, path: Path) -> str:
         try:
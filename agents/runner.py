@@ -2,43 +2,71 @@ import subprocess
 from pathlib import Path
 import logging
 import os
+import site
+from .logstore import get_log_store
+from .workspace import get_index
 
 logger = logging.getLogger(__name__)
 
+def find_main_file(context: dict, project_path: str, exists=os.path.exists) -> str:
+    """Determine the main file to run (defaulting to "main.py"), falling back to the last created file."""
+    main_file = context.get("main_file", "main.py")
+    if not exists(Path(project_path) / main_file):
+        fallback = context.get("last_created_file", "")
+        if fallback:
+            main_file = fallback
+    return main_file
+
+def python_executable(venv_path: str = None):
+    """Use venv path if provided; fallback to system python."""
+    if venv_path:
+        python_exec = Path(venv_path) / ("Scripts" if os.name == "nt" else "bin") / "python"
+        if not python_exec.exists():
+            logger.error(f"Python executable not found in venv: {python_exec}")
+            raise FileNotFoundError(f"Python executable not found: {python_exec}")
+        return python_exec
+    return "python"
+
+def environment_signature(python_exec) -> tuple:
+    """Cheap signature of the interpreter's installed packages (site-packages directory mtimes)."""
+    if python_exec == "python":
+        site_dirs = [Path(p) for p in site.getsitepackages()]
+    else:
+        venv = Path(python_exec).parent.parent
+        site_dirs = list(venv.glob("lib/python*/site-packages")) + list(venv.glob("Lib/site-packages"))
+    return tuple((str(d), d.stat().st_mtime_ns) for d in site_dirs if d.exists())
+
 class RunnerAgent:
+    def __init__(self):
+        # project path -> (snapshot id, run key, succeeded, output handle); lets unchanged projects skip the subprocess
+        self.last_runs = {}
+
     def run_main(self, state: dict) -> dict:
         # Extract project path from state
         plan = state.get("plan", {})
         context = plan.get("context", {})
         project_path = context.get("last_created_dir", ".")
         
-        # Determine the main file to run (defaulting to "main.py")
-        main_file = context.get("main_file", "main.py")
+        index = get_index(project_path) if Path(project_path).is_dir() else None
+        exists = index.exists if index else os.path.exists
+        main_file = find_main_file(context, project_path, exists)
         main_path = Path(project_path) / main_file
-        
-        # If not found, try to fall back to the last created file
-        if not main_path.exists():
-            fallback = context.get("last_created_file", "")
-            if fallback:
-                main_file = fallback
-                main_path = Path(project_path) / main_file
-        if not main_path.exists():
+        if not exists(main_path):
             error_message = f"{main_file} not found in project path: {project_path}"
             logger.error(error_message)
             state.setdefault("errors", []).append(error_message)
             state.update({"status": "error"})
             return state
 
-        # Use venv path if provided; fallback to system python
-        venv_path = context.get("venv_path", None)
-        if venv_path:
-            python_exec = Path(venv_path) / ("Scripts" if os.name == "nt" else "bin") / "python"
-            if not python_exec.exists():
-                logger.error(f"Python executable not found in venv: {python_exec}")
-                raise FileNotFoundError(f"Python executable not found: {python_exec}")
-        else:
-            python_exec = "python"
+        python_exec = python_executable(context.get("venv_path", None))
+
+        run_key = (str(main_path), str(python_exec), environment_signature(python_exec))
+        previous = self.last_runs.get(project_path)
+        if index and previous and previous[1] == run_key and not index.changed_since(previous[0]):
+            logger.info(f"No changes since last run of {main_file}, reusing its result")
+            return self._record_result(state, main_file, previous[2], previous[3])
 
+        snapshot_id = index.snapshot() if index else None
         try:
             logger.info(f"Running: {python_exec} {main_path}")
             result = subprocess.run(
@@ -47,14 +75,28 @@ class RunnerAgent:
                 text=True,
                 check=True
             )
-            logger.info(f"Output: {result.stdout}")
+            succeeded, output = True, result.stdout
+        except subprocess.CalledProcessError as e:
+            succeeded, output = False, e.stderr
+        # Only a handle to the output goes into the state; the text lives in the log store
+        output = get_log_store().append(output)
+
+        if index:
+            if previous:
+                index.release(previous[0])
+            self.last_runs[project_path] = (snapshot_id, run_key, succeeded, output)
+        return self._record_result(state, main_file, succeeded, output)
+
+    def _record_result(self, state: dict, main_file: str, succeeded: bool, output: str) -> dict:
+        preview = get_log_store().preview(output)
+        if succeeded:
+            logger.info(f"Output: {preview}")
             state.setdefault("messages", []).append(
-                {"role": "system", "content": f"Runner output: {result.stdout}"}
+                {"role": "system", "content": f"Runner output: {preview}"}
             )
-            state.update({"last_run_output": result.stdout})
-            return state
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Error running {main_file}: {e.stderr}")
-            state.setdefault("errors", []).append(e.stderr)
+            state.update({"last_run_output": output})
+        else:
+            logger.error(f"Error running {main_file}: {preview}")
+            state.setdefault("errors", []).append(output)
             state.update({"status": "error"})
-            return state
+        return state
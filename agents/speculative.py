@@ -0,0 +1,220 @@
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.messages import AIMessage
+from .blobstore import copy_file
+from .budget import budget_mode
+from .logstore import get_log_store
+from .patching import Edit, apply_edits, parse_edits, write_atomic
+from .runner import find_main_file, python_executable
+from .workspace import SKIP_DIRS, get_index
+
+logger = logging.getLogger(__name__)
+
+CANDIDATE_RE = re.compile(r"^#+\s*CANDIDATE\s+\d+\s*$", re.MULTILINE | re.IGNORECASE)
+
+def clone_workspace(src: str, dst: str) -> None:
+    """
+    Clone a project for a candidate run. Python sources are hardlinked: candidate
+    edits replace them (write_atomic), never write in place. Every other file is
+    reflinked or copied, because the candidate program itself may open data files
+    for writing and must not reach the original through a shared inode. Bytecode
+    caches are left out; virtual environments and other skipped directories are symlinked.
+    """
+    src_root, dst_root = Path(src), Path(dst)
+    for current, dirs, files in os.walk(src_root):
+        current = Path(current)
+        target = dst_root / current.relative_to(src_root)
+        target.mkdir(parents=True, exist_ok=True)
+        for name in list(dirs):
+            if name == "__pycache__":
+                dirs.remove(name)
+            elif name in SKIP_DIRS or (current / name / "pyvenv.cfg").exists():
+                os.symlink(current / name, target / name, target_is_directory=True)
+                dirs.remove(name)
+        for name in files:
+            if name.endswith(".py"):
+                try:
+                    os.link(current / name, target / name)
+                    continue
+                except OSError:
+                    pass  # Cross-device or unsupported filesystem
+            copy_file(current / name, target / name)
+
+def error_signature(log: str) -> str:
+    """The error's last line with paths and numbers masked, so recurrences of one error match."""
+    lines = [line.strip() for line in log.strip().splitlines() if line.strip()]
+    last = lines[-1] if lines else ""
+    last = re.sub(r"(['\"]?)(/[^\s'\"]+|[A-Za-z]:\\[^\s'\"]+)\1", "<path>", last)
+    return re.sub(r"\d+", "<n>", last)
+
+class SpeculativeFixer:
+    """Explores several candidate fixes at once, each in its own cloned workspace."""
+
+    def __init__(self, llm, candidates: int = 3, timeout: float = 120.0, max_code_chars: int = 60_000):
+        self.llm = llm
+        self.candidates = candidates
+        self.timeout = timeout
+        self.max_code_chars = max_code_chars
+        self.fix_cache: Dict[str, List[List[Edit]]] = {}  # error signature -> edits that fixed it
+
+    def run(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        plan = state.get("plan", {})
+        context = plan.get("context", {})
+        project_path = context.get("last_created_dir", ".")
+        last_error = state["errors"][-1] if state.get("errors") else ""
+        log_store = get_log_store()
+        error_log = log_store.preview(last_error)
+
+        signature = error_signature(log_store.tail(last_error, 1000))
+        try:
+            # Fixes that resolved the same error before cost no LLM call, so they go first
+            winner, edits = self._evaluate_all(self.fix_cache.get(signature, []), project_path, context)
+            if winner is None:
+                # When the budget runs low, explore a single candidate instead of K
+                count = 1 if budget_mode(state) != "normal" else self.candidates
+                candidates = self._propose(project_path, error_log, count)
+                logger.info(f"Evaluating {len(candidates)} candidate fix(es) in parallel")
+                winner, edits = self._evaluate_all(candidates, project_path, context)
+                if winner is not None:
+                    self.fix_cache[signature] = ([edits] + self.fix_cache.get(signature, []))[:self.candidates]
+            else:
+                logger.info("Reused a cached fix")
+        except Exception as e:
+            logger.error(f"Speculative fix exploration failed: {e}")
+            winner = None
+
+        if winner is None:
+            logger.info("No candidate fix passed, falling back to re-planning")
+            state.update({"status": "speculation_failed"})
+            return state
+
+        index = get_index(project_path)
+        for path, content in winner.items():
+            write_atomic(Path(project_path) / path, content)
+            index.record(Path(project_path) / path)
+        state.setdefault("messages", []).append(
+            AIMessage(content=f"Applied speculative fix to: {', '.join(sorted(winner))}")
+        )
+        state.update({"status": "fix_applied", "errors": [], "precheck_errors": []})
+        return state
+
+    def _propose(self, project_path: str, error_log: str, count: int) -> List[List[Edit]]:
+        index = get_index(project_path)
+        code, used = [], 0
+        for rel in index.files(".py"):
+            source = (index.root / rel).read_text(errors="replace")
+            if used + len(source) > self.max_code_chars:
+                break
+            code.append(f"{rel}:\n{source}")
+            used += len(source)
+        code_listing = "\n\n".join(code)
+
+        prompt = f"""This Python project fails with:
+{error_log}
+
+Project files:
+{code_listing}
+
+Propose {count} independent candidate fix(es), each taking a different approach.
+Start each candidate with a line "### CANDIDATE <n>" followed by search/replace edits in this exact format:
+
+path/relative/to/project.py
+<<<<<<< SEARCH
+exact lines currently in the file
+=======
+replacement lines
+>>>>>>> REPLACE"""
+        response = self.llm.invoke([{"role": "user", "content": prompt}]).content
+        sections = CANDIDATE_RE.split(response)[1:] or [response]
+        candidates = [parse_edits(section) for section in sections]
+        return [edits for edits in candidates if edits][:count]
+
+    def _evaluate_all(
+        self, candidates: List[List[Edit]], project_path: str, context: Dict[str, Any]
+    ) -> Tuple[Optional[Dict[str, str]], Optional[List[Edit]]]:
+        """Evaluate candidates concurrently; returns the first passing one's changed files and edits."""
+        if not candidates:
+            return None, None
+        python_exec = python_executable(context.get("venv_path"))
+        # Candidates run with the clone as cwd, where a relative venv path means nothing.
+        # abspath, not resolve(): following the venv's python symlink would leave the venv
+        python_exec = os.path.abspath(python_exec) if isinstance(python_exec, Path) else python_exec
+        main_file = find_main_file(context, project_path)
+        found = threading.Event()
+
+        pool = ThreadPoolExecutor(max_workers=len(candidates))
+        futures = {
+            pool.submit(self._evaluate, i, edits, project_path, python_exec, main_file, found): edits
+            for i, edits in enumerate(candidates, 1)
+        }
+        try:
+            for future in as_completed(futures):
+                changed = future.result()
+                if changed is not None:
+                    found.set()
+                    return changed, futures[future]
+            return None, None
+        finally:
+            # Don't wait for slower candidates; they stop at their next checkpoint
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _evaluate(
+        self,
+        candidate: int,
+        edits: List[Edit],
+        project_path: str,
+        python_exec: str,
+        main_file: str,
+        found: threading.Event,
+    ) -> Optional[Dict[str, str]]:
+        """Apply a candidate in a clone and run it; returns the changed files if it passes, None otherwise."""
+        clone = Path(tempfile.mkdtemp(prefix=f"candidate-{candidate}-"))
+        try:
+            clone_workspace(project_path, str(clone))
+            changed, failed = apply_edits(clone, edits)
+            if failed or not changed:
+                logger.info(f"Candidate {candidate} did not apply cleanly")
+                return None
+            for path, content in changed.items():
+                write_atomic(clone / path, content)
+
+            if found.is_set():
+                return None
+            run = self._run([python_exec, str(clone / main_file)], cwd=None)
+            if run.returncode != 0:
+                logger.info(f"Candidate {candidate} failed to run")
+                return None
+
+            if found.is_set():
+                return None
+            names = [Path(rel).name for rel in get_index(project_path).files(".py")]
+            if any(name.startswith("test_") or name.endswith("_test.py") for name in names):
+                tests = self._run([python_exec, "-m", "pytest", "-q", "-x"], cwd=clone)
+                if tests.returncode != 0 and "No module named pytest" not in tests.stderr:
+                    logger.info(f"Candidate {candidate} failed its tests")
+                    return None
+
+            logger.info(f"Candidate {candidate} passed")
+            return changed
+        except subprocess.TimeoutExpired:
+            logger.info(f"Candidate {candidate} timed out")
+            return None
+        except Exception as e:
+            # One broken candidate must not take the others down with it
+            logger.warning(f"Candidate {candidate} could not be evaluated: {e}")
+            return None
+        finally:
+            shutil.rmtree(clone, ignore_errors=True)
+
+    def _run(self, command: List[str], cwd: Optional[Path]) -> subprocess.CompletedProcess:
+        # Bytecode compiled in the clone would otherwise land in the symlinked venv
+        env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+        return subprocess.run(command, cwd=cwd, env=env, capture_output=True, text=True, timeout=self.timeout)
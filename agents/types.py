@@ -15,7 +15,7 @@ class ValidationResult(TypedDict):
     details: Optional[Dict[str, Any]]
 
 class StepValidation(TypedDict):
-    type: str  # file_exists, command_output, custom
+    type: str  # file_exists, file_hash, importable, command_exit_code, command_output, custom
     criteria: Union[str, List[str]]
     expected_result: Any
 
@@ -0,0 +1,212 @@
+import hashlib
+import logging
+import os
+import re
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .runner import python_executable
+from .types import Action, ActionResult, ValidationResult
+from .workspace import find_index
+
+logger = logging.getLogger(__name__)
+
+# Commands with any of these need a shell; everything else is exec'd directly
+SHELL_SYNTAX_RE = re.compile(r"[|&;<>()$`*?\[\]{}~]|^\s*\w+=")
+
+class StatCache:
+    """
+    File lookups shared by one batch of validations. Paths inside an indexed
+    workspace are answered by its WorkspaceIndex; other paths are stat'ed and
+    hashed at most once per batch.
+    """
+
+    def __init__(self):
+        self.exists_cache: Dict[str, bool] = {}
+        self.hash_cache: Dict[str, Optional[str]] = {}
+        self.lock = threading.Lock()
+
+    def exists(self, path: str) -> bool:
+        index = find_index(path)
+        if index:
+            return index.exists(path)
+        key = os.path.abspath(path)
+        with self.lock:
+            if key not in self.exists_cache:
+                self.exists_cache[key] = os.path.exists(key)
+            return self.exists_cache[key]
+
+    def sha256(self, path: str) -> Optional[str]:
+        index = find_index(path)
+        if index and index.exists(path):
+            digest = index.hash(Path(path).resolve().relative_to(index.root).as_posix())
+            if digest is not None:
+                return digest
+        key = os.path.abspath(path)
+        with self.lock:
+            if key not in self.hash_cache:
+                try:
+                    self.hash_cache[key] = hashlib.sha256(Path(key).read_bytes()).hexdigest()
+                except OSError:
+                    self.hash_cache[key] = None
+            return self.hash_cache[key]
+
+class ValidationContext:
+    """What a validator may look at besides its own criteria."""
+
+    def __init__(self, action: Action, result: ActionResult, context: Dict[str, Any], stats: StatCache, timeout: float):
+        self.action = action
+        self.result = result
+        self.context = context
+        self.stats = stats
+        self.timeout = timeout
+
+    @property
+    def cwd(self) -> Optional[str]:
+        directory = self.context.get("last_created_dir")
+        return directory if directory and os.path.isdir(directory) else None
+
+Validator = Callable[[Any, Any, ValidationContext], Tuple[bool, str]]
+
+def _as_list(criteria: Any) -> List[str]:
+    return [str(item) for item in criteria] if isinstance(criteria, (list, tuple)) else [str(criteria)]
+
+def validate_file_exists(criteria: Any, expected: Any, ctx: ValidationContext) -> Tuple[bool, str]:
+    want = expected is not False
+    wrong = [path for path in _as_list(criteria) if ctx.stats.exists(path) != want]
+    if wrong:
+        return False, f"{'Missing' if want else 'Unexpected'}: {', '.join(wrong)}"
+    return True, ""
+
+def validate_file_hash(criteria: Any, expected: Any, ctx: ValidationContext) -> Tuple[bool, str]:
+    path = str(criteria)
+    digest = ctx.stats.sha256(path)
+    if digest is None:
+        return False, f"Missing: {path}"
+    expected = expected or ctx.action.get("params", {}).get("content_hash")
+    if expected and digest != expected:
+        return False, f"{path} has sha256 {digest[:12]}, expected {str(expected)[:12]}"
+    return True, ""
+
+def _run(
+    command, ctx: ValidationContext, shell: bool = False, cwd: Optional[str] = None
+) -> Tuple[Optional[subprocess.CompletedProcess], str]:
+    try:
+        return subprocess.run(
+            command, shell=shell, cwd=cwd, capture_output=True, text=True, timeout=ctx.timeout
+        ), ""
+    except subprocess.TimeoutExpired:
+        return None, f"Timed out after {ctx.timeout}s"
+    except OSError as e:
+        return None, str(e)
+
+def validate_importable(criteria: Any, expected: Any, ctx: ValidationContext) -> Tuple[bool, str]:
+    modules = _as_list(criteria)
+    try:
+        python = python_executable(ctx.context.get("venv_path")) if ctx.context.get("venv_path") else sys.executable
+    except FileNotFoundError as e:
+        return False, str(e)
+    # One interpreter start checks every module; the project directory makes its own modules importable
+    process, error = _run([str(python), "-c", f"import {', '.join(modules)}"], ctx, cwd=ctx.cwd)
+    if process is None:
+        return False, error
+    if process.returncode != 0:
+        lines = process.stderr.strip().splitlines()
+        return False, lines[-1] if lines else f"Could not import {', '.join(modules)}"
+    return True, ""
+
+def validate_command(criteria: Any, expected: Any, ctx: ValidationContext) -> Tuple[bool, str]:
+    """Exit code check; a string `expected_result` must also appear in stdout."""
+    if isinstance(criteria, (list, tuple)):
+        process, error = _run([str(part) for part in criteria], ctx)
+    elif SHELL_SYNTAX_RE.search(criteria):
+        process, error = _run(criteria, ctx, shell=True)
+    else:
+        process, error = _run(shlex.split(criteria), ctx)
+    if process is None:
+        return False, error
+    expected_code = expected if isinstance(expected, int) and not isinstance(expected, bool) else 0
+    if process.returncode != expected_code:
+        return False, f"Exited with {process.returncode}, expected {expected_code}"
+    if isinstance(expected, str) and expected not in process.stdout:
+        return False, f"Output does not contain {expected!r}"
+    return True, ""
+
+def validate_completed(criteria: Any, expected: Any, ctx: ValidationContext) -> Tuple[bool, str]:
+    """The planner's default: the action's handler ran without reporting an error."""
+    error = (ctx.result or {}).get("error")
+    return (False, str(error)) if error else (True, "")
+
+DEFAULT_VALIDATORS: Dict[str, Validator] = {
+    "file_exists": validate_file_exists,
+    "file_hash": validate_file_hash,
+    "importable": validate_importable,
+    "command_exit_code": validate_command,
+    "command_output": validate_command,
+    "custom": validate_completed,
+}
+
+class ValidationEngine:
+    """
+    Runs the validations of a scheduling wave as one concurrent batch.
+    Validator types are pluggable through `register`; a type without a
+    validator falls back to checking that the action completed, with a warning.
+    """
+
+    def __init__(self, max_workers: int = 8, timeout: float = 60.0):
+        self.validators: Dict[str, Validator] = dict(DEFAULT_VALIDATORS)
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="validate")
+
+    def register(self, validation_type: str, validator: Validator) -> None:
+        self.validators[validation_type] = validator
+
+    def validate(self, action: Action, result: ActionResult, context: Dict[str, Any], stats: StatCache) -> ValidationResult:
+        spec = action.get("validation")
+        if not spec:
+            return {"success": True, "message": "", "details": {"latency_ms": 0.0}}
+
+        validation_type = spec.get("type", "custom")
+        validator = self.validators.get(validation_type)
+        if validator is None:
+            logger.warning(f"No validator for type '{validation_type}', checking that the action completed")
+            validator = validate_completed
+
+        start = time.perf_counter()
+        try:
+            success, message = validator(
+                spec.get("criteria"), spec.get("expected_result"), ValidationContext(action, result, context, stats, self.timeout)
+            )
+        except Exception as e:
+            success, message = False, f"Validator '{validation_type}' failed: {e}"
+        latency_ms = (time.perf_counter() - start) * 1000
+        return {
+            "success": success,
+            "message": message or spec.get("message", ""),
+            "details": {"type": validation_type, "latency_ms": round(latency_ms, 2)},
+        }
+
+    def validate_batch(
+        self, items: List[Tuple[Action, ActionResult]], context: Dict[str, Any]
+    ) -> List[ValidationResult]:
+        """Validate a wave of executed actions concurrently; results come back in input order."""
+        stats = StatCache()
+        start = time.perf_counter()
+        futures = [self.pool.submit(self.validate, action, result, context, stats) for action, result in items]
+        results = [future.result() for future in futures]
+        if results:
+            slowest = max(range(len(results)), key=lambda i: results[i]["details"]["latency_ms"])
+            logger.info(
+                f"Validated {len(results)} action(s) in {(time.perf_counter() - start) * 1000:.1f} ms "
+                f"(slowest: {items[slowest][0].get('description', '')!r} "
+                f"{results[slowest]['details']['latency_ms']} ms)"
+            )
+        return results
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,99 @@
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+class VenvPool:
+    """
+    Keeps a few ready-made virtual environments so creating one is a rename
+    instead of a multi-second `python -m venv` (ensurepip dominates that time).
+    Warm venvs are refilled in the background.
+    """
+
+    def __init__(self, size: int = 2, root: Optional[str] = None, python: str = "python"):
+        self.size = size
+        self.python = python
+        self.root = Path(root or tempfile.mkdtemp(prefix="venv-pool-"))
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.ready: List[Path] = []
+        self.lock = threading.Lock()
+        self._refilling = False
+        self.refill()
+
+    def _create(self, path: Path) -> None:
+        subprocess.run([self.python, "-m", "venv", str(path)], check=True, capture_output=True)
+
+    def refill(self) -> None:
+        """Top the pool up to `size` warm venvs in a background thread."""
+        with self.lock:
+            if self._refilling or len(self.ready) >= self.size:
+                return
+            self._refilling = True
+
+        def fill():
+            try:
+                while True:
+                    with self.lock:
+                        if len(self.ready) >= self.size:
+                            return
+                    path = Path(tempfile.mkdtemp(prefix="warm-", dir=self.root))
+                    shutil.rmtree(path)
+                    try:
+                        self._create(path)
+                    except (subprocess.CalledProcessError, OSError) as e:
+                        logger.warning(f"Could not pre-create venv: {e}")
+                        return
+                    with self.lock:
+                        self.ready.append(path)
+            finally:
+                with self.lock:
+                    self._refilling = False
+
+        threading.Thread(target=fill, daemon=True, name="venv-pool-refill").start()
+
+    def acquire(self, dest: str) -> bool:
+        """
+        Move a warm venv to `dest`. Returns False (and leaves creation to the caller)
+        when none is ready or `dest` already exists.
+        """
+        dest_path = Path(dest).resolve()
+        if dest_path.exists():
+            return False
+        with self.lock:
+            warm = self.ready.pop() if self.ready else None
+        if warm is None:
+            self.refill()
+            return False
+
+        try:
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(warm), str(dest_path))
+            relocate_venv(warm, dest_path)
+        except OSError as e:
+            logger.warning(f"Could not move warm venv to {dest_path}: {e}")
+            shutil.rmtree(warm, ignore_errors=True)
+            return False
+        finally:
+            self.refill()
+        logger.info(f"Reused warm virtual environment for {dest_path}")
+        return True
+
+    def close(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+def relocate_venv(old: Path, new: Path) -> None:
+    """Rewrite the absolute venv path baked into activate scripts and console-script shebangs."""
+    old_bytes, new_bytes = os.fsencode(str(old)), os.fsencode(str(new))
+    bin_dir = new / ("Scripts" if os.name == "nt" else "bin")
+    for script in bin_dir.iterdir():
+        if script.is_symlink() or not script.is_file() or script.stat().st_size > 64 * 1024:
+            continue
+        data = script.read_bytes()
+        if old_bytes in data:
+            script.write_bytes(data.replace(old_bytes, new_bytes))
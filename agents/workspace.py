@@ -0,0 +1,324 @@
+import ctypes
+import ctypes.util
+import hashlib
+import itertools
+import logging
+import os
+import stat
+import struct
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SKIP_DIRS = {"__pycache__", "venv", ".venv", "env", ".git", "node_modules"}
+
+# Each index holds an inotify instance, and those are limited per user (fs.inotify.max_user_instances)
+MAX_INDEXES = int(os.getenv("WORKSPACE_MAX_INDEXES", 64))
+
+def is_ignored(root: Path, path: Path) -> bool:
+    """True for files inside virtual environments, caches and hidden directories."""
+    rel = path.relative_to(root)
+    if any(part in SKIP_DIRS or part.startswith(".") for part in rel.parts[:-1]):
+        return True
+    return len(rel.parts) > 1 and (root / rel.parts[0] / "pyvenv.cfg").exists()
+
+def _skip_dir(entry: os.DirEntry) -> bool:
+    return (
+        entry.name in SKIP_DIRS
+        or entry.name.startswith(".")
+        or os.path.exists(os.path.join(entry.path, "pyvenv.cfg"))
+    )
+
+class FileEntry:
+    """Stat record for one file; the content hash is only computed when asked for."""
+
+    __slots__ = ("size", "mtime_ns", "_hash")
+
+    def __init__(self, size: int, mtime_ns: int):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self._hash: Optional[str] = None
+
+    def signature(self) -> Tuple[int, int]:
+        return self.size, self.mtime_ns
+
+class _InotifyWatcher:
+    """Minimal recursive inotify watcher over ctypes; Linux only."""
+
+    IN_MODIFY = 0x2
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_MOVE_SELF = 0x800
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ONLYDIR = 0x1000000
+    MASK = (
+        IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+        | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+    )
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches: Dict[int, str] = {}
+
+    def add(self, directory: str) -> None:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self.watches[wd] = directory
+
+    def read(self) -> Tuple[List[str], bool]:
+        """Drain pending events; returns (touched paths, whether the queue overflowed)."""
+        paths, overflow = [], False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return paths, overflow
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+                name = data[offset + self.EVENT.size:offset + self.EVENT.size + length].rstrip(b"\0")
+                offset += self.EVENT.size + length
+                if mask & self.IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                directory = self.watches.get(wd)
+                if mask & self.IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+                if directory is not None:
+                    paths.append(os.path.join(directory, os.fsdecode(name)) if name else directory)
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+class WorkspaceIndex:
+    """
+    Index of a project directory: path, size, mtime and a lazily computed
+    content hash per file. Kept current with inotify where available and with
+    a stat-walk otherwise. Snapshots are cheap ids that `changed_since` diffs against.
+    """
+
+    def __init__(self, root: str, use_inotify: bool = True):
+        self.root = Path(root).resolve()
+        self.entries: Dict[str, FileEntry] = {}  # path relative to root -> entry
+        self.lock = threading.RLock()
+        self._snapshots: Dict[int, Dict[str, Tuple[int, int]]] = {}
+        self._snapshot_ids = itertools.count(1)
+        self._watcher: Optional[_InotifyWatcher] = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self._watcher = _InotifyWatcher()
+            except (OSError, AttributeError) as e:
+                logger.debug(f"inotify unavailable, using stat-walk: {e}")
+        self._walk()
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._watcher else "stat-walk"
+
+    def _rel(self, path) -> Optional[str]:
+        path = Path(path)
+        full = (path if path.is_absolute() else Path.cwd() / path).resolve()
+        try:
+            return full.relative_to(self.root).as_posix()
+        except ValueError:
+            return None
+
+    def _walk(self, directory: Optional[Path] = None) -> None:
+        """Stat-walk the tree (or a subtree), keeping hashes of files whose stat did not change."""
+        directory = directory or self.root
+        prefix = "" if directory == self.root else directory.relative_to(self.root).as_posix() + "/"
+        seen = set()
+        stack = [str(directory)]
+        while stack:
+            current = stack.pop()
+            if self._watcher:
+                try:
+                    self._watcher.add(current)
+                except OSError as e:
+                    logger.warning(f"{e}; falling back to stat-walk")
+                    self._watcher.close()
+                    self._watcher = None
+            try:
+                entries = list(os.scandir(current))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not _skip_dir(entry):
+                        stack.append(entry.path)
+                elif entry.is_file():
+                    rel = Path(entry.path).relative_to(self.root).as_posix()
+                    seen.add(rel)
+                    self._update(rel, entry.stat())
+        for rel in [rel for rel in self.entries if rel.startswith(prefix) and rel not in seen]:
+            del self.entries[rel]
+
+    def _update(self, rel: str, st: os.stat_result) -> None:
+        entry = self.entries.get(rel)
+        if entry is None or entry.signature() != (st.st_size, st.st_mtime_ns):
+            self.entries[rel] = FileEntry(st.st_size, st.st_mtime_ns)
+
+    def _refresh_path(self, rel: str) -> None:
+        full = self.root / rel
+        try:
+            st = full.stat()
+        except FileNotFoundError:
+            self.entries.pop(rel, None)
+            prefix = rel + "/"
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                del self.entries[key]
+            return
+        if stat.S_ISDIR(st.st_mode):
+            if not is_ignored(self.root, full / "_"):
+                self._walk(full)
+        elif stat.S_ISREG(st.st_mode) and not is_ignored(self.root, full):
+            self._update(rel, st)
+
+    def refresh(self) -> None:
+        """Bring the index up to date: drain inotify events, or stat-walk the tree."""
+        with self.lock:
+            if not self._watcher:
+                self._walk()
+                return
+            paths, overflow = self._watcher.read()
+            if overflow:
+                logger.info("inotify queue overflowed, re-walking workspace")
+                self._walk()
+                return
+            for path in dict.fromkeys(paths):
+                rel = self._rel(path)
+                if rel is not None and rel != ".":
+                    self._refresh_path(rel)
+
+    def record(self, path) -> None:
+        """Update a single path right away, e.g. after the caller wrote it."""
+        rel = self._rel(path)
+        if rel is not None:
+            with self.lock:
+                self._refresh_path(rel)
+
+    def exists(self, path) -> bool:
+        rel = self._rel(path)
+        if rel is None:
+            return Path(path).exists()
+        with self.lock:
+            if self._watcher:
+                self.refresh()
+            else:
+                # Without events a single stat is the cheapest correct answer
+                self._refresh_path(rel)
+            return rel in self.entries or (self.root / rel).is_dir()
+
+    def hash(self, rel: str) -> Optional[str]:
+        """Content hash of an indexed file (path relative to the root), computed at most once per (size, mtime)."""
+        with self.lock:
+            entry = self.entries.get(rel)
+            if entry is None:
+                return None
+            if entry._hash is None:
+                entry._hash = hashlib.sha256((self.root / rel).read_bytes()).hexdigest()
+            return entry._hash
+
+    def files(self, suffix: str = "") -> List[str]:
+        """Relative paths of indexed files, optionally filtered by suffix, in stable order."""
+        with self.lock:
+            return sorted(rel for rel in self.entries if rel.endswith(suffix))
+
+    def snapshot(self) -> int:
+        """Refresh and record the current state; returns an id for `changed_since`."""
+        with self.lock:
+            self.refresh()
+            snapshot_id = next(self._snapshot_ids)
+            self._snapshots[snapshot_id] = {rel: entry.signature() for rel, entry in self.entries.items()}
+            return snapshot_id
+
+    def changed_since(self, snapshot_id: Optional[int]) -> Dict[str, str]:
+        """Paths added, modified or removed since a snapshot; everything counts as added for None."""
+        with self.lock:
+            self.refresh()
+            before = self._snapshots.get(snapshot_id, {}) if snapshot_id else {}
+            changes = {}
+            for rel, entry in self.entries.items():
+                if rel not in before:
+                    changes[rel] = "added"
+                elif before[rel] != entry.signature():
+                    changes[rel] = "modified"
+            for rel in before:
+                if rel not in self.entries:
+                    changes[rel] = "removed"
+            return changes
+
+    def release(self, snapshot_id: int) -> None:
+        with self.lock:
+            self._snapshots.pop(snapshot_id, None)
+
+    def close(self) -> None:
+        """Stop watching; an index still in use afterwards falls back to stat-walks."""
+        with self.lock:
+            if self._watcher:
+                self._watcher.close()
+                self._watcher = None
+
+_indexes: "OrderedDict[Path, WorkspaceIndex]" = OrderedDict()  # least recently used first
+_indexes_lock = threading.Lock()
+
+def get_index(project_path: str) -> WorkspaceIndex:
+    """Shared index for a project directory, so every agent sees the same view."""
+    root = Path(project_path).resolve()
+    evicted = []
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = WorkspaceIndex(str(root))
+            while len(_indexes) > MAX_INDEXES:
+                evicted.append(_indexes.popitem(last=False)[1])
+        else:
+            _indexes.move_to_end(root)
+    for old in evicted:
+        logger.debug(f"Evicting workspace index of {old.root}")
+        old.close()
+    return index
+
+def find_index(path) -> Optional[WorkspaceIndex]:
+    """The existing index whose root contains `path`, if any."""
+    full = Path(path).resolve()
+    with _indexes_lock:
+        for candidate in (full, *full.parents):
+            index = _indexes.get(candidate)
+            if index is not None:
+                return index
+    return None
+
+def release_indexes(path) -> int:
+    """Close and forget the indexes of `path` and every directory below it; returns how many."""
+    base = Path(path).resolve()
+    with _indexes_lock:
+        roots = [root for root in _indexes if root == base or base in root.parents]
+        released = [_indexes.pop(root) for root in roots]
+    for index in released:
+        index.close()
+    return len(released)
+
+def close_indexes() -> None:
+    """Release every index, e.g. on shutdown."""
+    with _indexes_lock:
+        released = list(_indexes.values())
+        _indexes.clear()
+    for index in released:
+        index.close()
@@ -1,67 +1,336 @@
 import logging
-from openai import AzureOpenAI
+from typing import Any, Callable, Dict, Optional
+from openai import AzureOpenAI, NotFoundError
+from assistant_registry import AssistantRegistry
+from llm_pool import LLMClientPool, estimate_tokens
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_SESSION = "default"
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation so far for your own future reference. Keep decisions, "
+    "file names, open problems and the user's goals; drop pleasantries and superseded details."
+)
+SUMMARY_REQUEST = "Summarize our conversation so far as instructed."
+
+# Keyword arguments consumed by LLMClientPool.call
+POOL_ONLY_KWARGS = ("coalesce_key", "estimated_tokens", "idempotent")
+
+def is_not_found(error: Exception) -> bool:
+    """Whether an API error means the assistant or thread no longer exists remotely."""
+    return isinstance(error, NotFoundError) or getattr(error, "status_code", None) == 404
+
+class ThreadPolicy:
+    """Lifecycle policy for assistant threads: when to rotate and how much history a run sees."""
+
+    def __init__(self, max_messages: int = 40, max_tokens: int = 50_000, truncate_last_messages: Optional[int] = 20):
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+        self.truncate_last_messages = truncate_last_messages
+
+    def should_rotate(self, record: Dict[str, Any]) -> bool:
+        return record["messages"] >= self.max_messages or record["tokens"] >= self.max_tokens
+
+    def truncation_strategy(self) -> Optional[Dict[str, Any]]:
+        if not self.truncate_last_messages:
+            return None
+        return {"type": "last_messages", "last_messages": self.truncate_last_messages}
+
 class AssistantManager:
-    def __init__(self, client: AzureOpenAI):
+    def __init__(
+        self,
+        client: AzureOpenAI,
+        pool: Optional[LLMClientPool] = None,
+        registry: Optional[AssistantRegistry] = None,
+        stream: bool = False,
+        thread_policy: Optional[ThreadPolicy] = None,
+    ):
         self.client = client
-        self.assistants = {}
-        self.threads = {}
-        
-    # def create_assistant(self, name: str, instructions: str, tools: list = None):
-    #     """Create an assistant with specified configuration."""
-    #     try:
-    #         if tools is None:
-    #             tools = [{"type": "code_interpreter"}]
-            
-    #         assistant = self.client.beta.assistants.create(
-    #             name=name,
-    #             instructions=instructions,
-    #             tools=tools,
-    #             model="o1-preview"
-    #         )
-    #         self.assistants[name] = assistant
-    #         return assistant
-    #     except Exception as e:
-    #         logger.error(f"Error creating assistant {name}: {str(e)}")
-    #         raise
-
-    def get_or_create_thread(self, assistant_name: str):
-        """Get existing thread or create a new one for an assistant."""
-        if assistant_name not in self.threads:
-            self.threads[assistant_name] = self.client.beta.threads.create()
-        return self.threads[assistant_name]
-
-    def run_conversation(self, assistant_name: str, prompt: str, instructions: str = None) -> str:
+        self.pool = pool
+        self.registry = registry or AssistantRegistry()
+        self.stream = stream
+        self.thread_policy = thread_policy or ThreadPolicy()
+        self.assistants = {}  # name -> assistant id
+        self.assistant_configs = {}  # name -> instructions, tools and model, to recreate a deleted assistant
+        self.threads = {}  # "session:assistant" -> thread record
+
+    def _call(self, fn, *args, **kwargs):
+        """Route an API call through the shared client pool when one is configured."""
+        if self.pool:
+            return self.pool.call(fn, *args, **kwargs)
+        # Scheduling hints are only understood by the pool, never by the SDK
+        for name in POOL_ONLY_KWARGS:
+            kwargs.pop(name, None)
+        return fn(*args, **kwargs)
+
+    def create_assistant(self, name: str, instructions: str, tools: list = None, model: str = "o1-preview") -> str:
+        """Create an assistant, reusing the registered one when its configuration is unchanged."""
+        try:
+            if tools is None:
+                tools = [{"type": "code_interpreter"}]
+            fingerprint = AssistantRegistry.fingerprint(instructions=instructions, tools=tools, model=model)
+
+            self.assistant_configs[name] = {"instructions": instructions, "tools": tools, "model": model}
+
+            entry = self.registry.get_assistant(name)
+            assistant_id = None
+            if entry and entry["fingerprint"] == fingerprint:
+                # Not verified here; a run that finds it deleted recreates it
+                logger.debug(f"Reusing registered assistant {name}: {entry['id']}")
+                assistant_id = entry["id"]
+            elif entry:
+                logger.info(f"Configuration of assistant {name} changed, updating {entry['id']}")
+                try:
+                    assistant_id = self._call(
+                        self.client.beta.assistants.update,
+                        entry["id"],
+                        instructions=instructions,
+                        tools=tools,
+                        model=model
+                    ).id
+                except Exception as e:
+                    if not is_not_found(e):
+                        raise
+                    logger.info(f"Registered assistant {entry['id']} no longer exists, creating {name} again")
+                    self.registry.remove_assistant(name)
+            if assistant_id is None:
+                assistant_id = self._call(
+                    self.client.beta.assistants.create,
+                    name=name,
+                    instructions=instructions,
+                    tools=tools,
+                    model=model,
+                    idempotent=False
+                ).id
+
+            self.registry.set_assistant(name, assistant_id, fingerprint)
+            self.assistants[name] = assistant_id
+            return assistant_id
+        except Exception as e:
+            logger.error(f"Error creating assistant {name}: {str(e)}")
+            raise
+
+    def get_or_create_thread(self, assistant_name: str, session_id: str = DEFAULT_SESSION) -> Dict[str, Any]:
+        """Get the session's thread record for an assistant, creating the thread if needed."""
+        key = self._thread_key(assistant_name, session_id)
+        if key not in self.threads:
+            record = self.registry.get_thread(key)
+            if not record:
+                thread_id = self._call(self.client.beta.threads.create, idempotent=False).id
+                record = {"id": thread_id, "messages": 0, "tokens": 0}
+                self.registry.set_thread(key, record)
+            self.threads[key] = record
+        return self.threads[key]
+
+    def end_session(self, session_id: str) -> None:
+        """Forget (and delete remotely) every thread belonging to a session."""
+        prefix = f"{session_id}:"
+        keys = {k for k in list(self.threads) + list(self.registry.data["threads"]) if k.startswith(prefix)}
+        for key in keys:
+            record = self.threads.pop(key, None) or self.registry.get_thread(key)
+            self.registry.remove_thread(key)
+            if record:
+                self._delete_thread(record["id"])
+
+    def run_conversation(
+        self,
+        assistant_name: str,
+        prompt: str,
+        instructions: str = None,
+        stream: Optional[bool] = None,
+        on_text: Optional[Callable[[str], None]] = None,
+        session_id: str = DEFAULT_SESSION,
+    ) -> str:
         """Run a conversation with an assistant and return the response."""
         try:
-            assistant = self.assistants.get(assistant_name)
-            if not assistant:
+            assistant_id = self.assistants.get(assistant_name)
+            if not assistant_id:
                 raise ValueError(f"Assistant {assistant_name} not found")
 
-            thread = self.get_or_create_thread(assistant_name)
-            
+            key = self._thread_key(assistant_name, session_id)
+            record = self.get_or_create_thread(assistant_name, session_id)
+            if self.thread_policy.should_rotate(record):
+                record = self._rotate_thread(key, record, assistant_id)
+
             # Add user message to thread
-            self.client.beta.threads.messages.create(
-                thread_id=thread.id,
-                role="user",
-                content=prompt
-            )
+            try:
+                self._add_message(record["id"], prompt)
+            except Exception as e:
+                if not is_not_found(e):
+                    raise
+                record = self._replace_lost_thread(key, record)
+                self._add_message(record["id"], prompt)
 
-            # Run the thread
-            run = self.client.beta.threads.runs.create_and_poll(
-                thread_id=thread.id,
-                assistant_id=assistant.id,
-                instructions=instructions
-            )
+            use_stream = self.stream if stream is None else stream
+            try:
+                reply = self._run_thread(
+                    record["id"], assistant_id, instructions, use_stream, on_text, estimate_tokens(prompt)
+                )
+            except Exception as e:
+                # The message just went into the thread, so it is the assistant that is gone
+                if not is_not_found(e) or assistant_name not in self.assistant_configs:
+                    raise
+                assistant_id = self._recreate_assistant(assistant_name, assistant_id)
+                reply = self._run_thread(
+                    record["id"], assistant_id, instructions, use_stream, on_text, estimate_tokens(prompt)
+                )
+            self._record_usage(key, record, prompt, reply)
+            return reply
 
-            if run.status == "completed":
-                messages = self.client.beta.threads.messages.list(thread_id=thread.id)
-                return messages.data[0].content[0].text.value
-            else:
-                raise Exception(f"Run failed with status: {run.status}")
-                
         except Exception as e:
             logger.error(f"Error in conversation with {assistant_name}: {str(e)}")
             raise
+
+    def _thread_key(self, assistant_name: str, session_id: str) -> str:
+        return f"{session_id}:{assistant_name}"
+
+    def _add_message(self, thread_id: str, prompt: str) -> None:
+        self._call(
+            self.client.beta.threads.messages.create,
+            thread_id=thread_id,
+            role="user",
+            content=prompt,
+            # A retried post after a timeout could add the message twice
+            idempotent=False
+        )
+
+    def _replace_lost_thread(self, key: str, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Forget a registered thread that was deleted remotely and start a new one."""
+        logger.info(f"Thread {record['id']} no longer exists, starting a new one for {key}")
+        self.threads.pop(key, None)
+        self.registry.remove_thread(key)
+        thread_id = self._call(self.client.beta.threads.create, idempotent=False).id
+        new_record = {"id": thread_id, "messages": 0, "tokens": 0}
+        self.threads[key] = new_record
+        self.registry.set_thread(key, new_record)
+        return new_record
+
+    def _recreate_assistant(self, name: str, lost_id: str) -> str:
+        """Drop a registered assistant that was deleted remotely and create it again."""
+        logger.info(f"Assistant {lost_id} no longer exists, creating {name} again")
+        self.registry.remove_assistant(name)
+        self.assistants.pop(name, None)
+        return self.create_assistant(name, **self.assistant_configs[name])
+
+    def _record_usage(self, key: str, record: Dict[str, Any], prompt: str, reply: str) -> None:
+        record["messages"] += 2
+        record["tokens"] += estimate_tokens(prompt) + estimate_tokens(reply)
+        self.registry.set_thread(key, record)
+
+    def _rotate_thread(self, key: str, record: Dict[str, Any], assistant_id: str) -> Dict[str, Any]:
+        """Replace a thread that outgrew the policy with a fresh one seeded by a summary."""
+        logger.info(
+            f"Rotating thread {record['id']} ({record['messages']} messages, ~{record['tokens']} tokens)"
+        )
+        try:
+            summary = self._run_thread(
+                record["id"],
+                assistant_id,
+                SUMMARY_INSTRUCTIONS,
+                False,
+                None,
+                record["tokens"],
+                additional_messages=[{"role": "user", "content": SUMMARY_REQUEST}],
+                # The summary must see the whole thread, not the truncated window
+                truncation_strategy={"type": "auto"}
+            )
+        except Exception as e:
+            # Losing the summary is better than keeping an ever-growing thread
+            logger.warning(f"Could not summarize thread {record['id']}: {e}")
+            summary = ""
+
+        messages = []
+        if summary:
+            messages.append({"role": "user", "content": f"Summary of the conversation so far:\n{summary}"})
+        thread_id = self._call(self.client.beta.threads.create, messages=messages, idempotent=False).id
+        self._delete_thread(record["id"])
+
+        new_record = {"id": thread_id, "messages": len(messages), "tokens": estimate_tokens(summary) if summary else 0}
+        self.threads[key] = new_record
+        self.registry.set_thread(key, new_record)
+        return new_record
+
+    def _delete_thread(self, thread_id: str) -> None:
+        try:
+            self._call(self.client.beta.threads.delete, thread_id)
+        except Exception as e:
+            logger.warning(f"Could not delete thread {thread_id}: {e}")
+
+    def _run_thread(
+        self,
+        thread_id: str,
+        assistant_id: str,
+        instructions: Optional[str],
+        stream: bool,
+        on_text: Optional[Callable[[str], None]],
+        estimated_tokens: int,
+        **run_kwargs,
+    ) -> str:
+        """Run the assistant on a thread and return the text of its reply."""
+        truncation_strategy = self.thread_policy.truncation_strategy()
+        if truncation_strategy:
+            run_kwargs.setdefault("truncation_strategy", truncation_strategy)
+
+        if stream:
+            return self._call(
+                self._run_streaming,
+                thread_id,
+                assistant_id,
+                instructions,
+                on_text,
+                estimated_tokens=estimated_tokens,
+                idempotent=False,
+                **run_kwargs
+            )
+
+        # Run the thread
+        run = self._call(
+            self.client.beta.threads.runs.create_and_poll,
+            thread_id=thread_id,
+            assistant_id=assistant_id,
+            instructions=instructions,
+            estimated_tokens=estimated_tokens,
+            idempotent=False,
+            **run_kwargs
+        )
+
+        if run.status == "completed":
+            # Only the newest message is needed, not the whole thread
+            messages = self._call(
+                self.client.beta.threads.messages.list,
+                thread_id=thread_id,
+                limit=1,
+                order="desc"
+            )
+            return messages.data[0].content[0].text.value
+        else:
+            raise Exception(f"Run failed with status: {run.status}")
+
+    def _run_streaming(
+        self,
+        thread_id: str,
+        assistant_id: str,
+        instructions: Optional[str],
+        on_text: Optional[Callable[[str], None]] = None,
+        **run_kwargs,
+    ) -> str:
+        """Run the thread over a server-sent event stream instead of polling."""
+        with self.client.beta.threads.runs.stream(
+            thread_id=thread_id,
+            assistant_id=assistant_id,
+            instructions=instructions,
+            **run_kwargs
+        ) as stream:
+            if on_text:
+                for delta in stream.text_deltas:
+                    on_text(delta)
+            stream.until_done()
+            run = stream.get_final_run()
+            if run.status != "completed":
+                raise Exception(f"Run failed with status: {run.status}")
+            messages = stream.get_final_messages()
+
+        if not messages:
+            raise Exception("Run completed without producing a message")
+        return messages[-1].content[0].text.value
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGISTRY_PATH = ".assistant_registry.json"
+
+
+class AssistantRegistry:
+    """
+    Local JSON registry of assistant and thread IDs so they survive restarts.
+
+    Assistants are stored with a fingerprint of their configuration; a changed
+    fingerprint tells the manager the remote assistant needs updating.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path or os.getenv("ASSISTANT_REGISTRY_PATH", DEFAULT_REGISTRY_PATH))
+        self.lock = threading.Lock()
+        self.data: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        data = {"assistants": {}, "threads": {}}
+        try:
+            with open(self.path, "r") as f:
+                data.update(json.load(f))
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Ignoring unreadable assistant registry {self.path}: {e}")
+        return data
+
+    def _save(self) -> None:
+        # Write to a temporary file first so a crash never leaves a truncated registry
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def fingerprint(**config: Any) -> str:
+        raw = json.dumps(config, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get_assistant(self, name: str) -> Optional[Dict[str, str]]:
+        return self.data["assistants"].get(name)
+
+    def set_assistant(self, name: str, assistant_id: str, fingerprint: str) -> None:
+        with self.lock:
+            self.data["assistants"][name] = {"id": assistant_id, "fingerprint": fingerprint}
+            self._save()
+
+    def remove_assistant(self, name: str) -> None:
+        with self.lock:
+            if self.data["assistants"].pop(name, None) is not None:
+                self._save()
+
+    def get_thread(self, key: str) -> Optional[Dict[str, Any]]:
+        record = self.data["threads"].get(key)
+        if isinstance(record, str):
+            # Older registries stored the bare thread id
+            record = {"id": record, "messages": 0, "tokens": 0}
+        return record
+
+    def set_thread(self, key: str, record: Dict[str, Any]) -> None:
+        with self.lock:
+            self.data["threads"][key] = record
+            self._save()
+
+    def remove_thread(self, key: str) -> None:
+        with self.lock:
+            if self.data["threads"].pop(key, None) is not None:
+                self._save()
@@ -0,0 +1,298 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# Failures after which the server cannot have acted on the request, so even calls that create something may retry
+NEVER_PROCESSED_STATUS_CODES = {429}
+
+
+class TokenBucket:
+    """Thread-safe token bucket that refills continuously at `rate` units per second."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """Block until `amount` units are available; returns the time spent waiting."""
+        # Requests larger than the bucket would never fit, so clamp them to a full bucket
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def debit(self, amount: float) -> None:
+        """Charge units after the fact (e.g. actual usage above the estimate), allowing debt."""
+        with self.lock:
+            self._refill()
+            self.tokens -= amount
+
+    def set_rate(self, rate: float) -> None:
+        with self.lock:
+            self._refill()
+            self.rate = rate
+
+
+class LLMClientPool:
+    """
+    Shared client layer for every LLM call made by the process.
+
+    - One bounded httpx connection pool shared by all OpenAI/Azure clients
+    - Token buckets on requests and tokens per minute
+    - Identical in-flight requests are coalesced into a single upstream call
+    - Adaptive backoff: honors retry-after headers, backs the request rate off
+      on throttling and recovers it gradually on success
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 60,
+        tokens_per_minute: float = 90_000,
+        max_connections: int = 10,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        timeout: float = 120.0,
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.request_bucket = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 60))
+        self.token_bucket = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+        )
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._current_rpm = requests_per_minute
+
+    @classmethod
+    def from_env(cls) -> "LLMClientPool":
+        """Build a pool from LLM_POOL_* environment variables, falling back to defaults."""
+        settings = {
+            "requests_per_minute": float(os.getenv("LLM_POOL_RPM", 60)),
+            "tokens_per_minute": float(os.getenv("LLM_POOL_TPM", 90_000)),
+            "max_connections": int(os.getenv("LLM_POOL_MAX_CONNECTIONS", 10)),
+            "max_retries": int(os.getenv("LLM_POOL_MAX_RETRIES", 5)),
+        }
+        return cls(**settings)
+
+    def azure_client(self, **kwargs):
+        """Create an AzureOpenAI client that shares this pool's connections.
+
+        Retries are disabled on the client itself since the pool owns them.
+        Pass `azure_endpoint` (e.g. a local stub server URL) to redirect traffic.
+        """
+        from openai import AzureOpenAI
+
+        return AzureOpenAI(http_client=self.http_client, max_retries=0, **kwargs)
+
+    def chat_model(self, **kwargs) -> "PooledChatModel":
+        """Create an AzureChatOpenAI model whose calls are routed through the pool."""
+        from langchain_openai import AzureChatOpenAI
+
+        llm = AzureChatOpenAI(http_client=self.http_client, max_retries=0, **kwargs)
+        return PooledChatModel(llm, self)
+
+    def call(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        coalesce_key: Optional[str] = None,
+        estimated_tokens: int = 0,
+        idempotent: bool = True,
+        **kwargs,
+    ) -> Any:
+        """
+        Run `fn(*args, **kwargs)` under the pool's rate limits and retry policy.
+        Concurrent calls sharing a `coalesce_key` wait for the first one's result.
+        Calls that create something (a message, a run) pass idempotent=False: they
+        are retried only when the request cannot have reached the server, since
+        a timeout after the server accepted it would otherwise create a duplicate.
+        """
+        if coalesce_key is None:
+            return self._call_with_retries(fn, args, kwargs, estimated_tokens, idempotent)
+
+        with self._lock:
+            future = self._in_flight.get(coalesce_key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[coalesce_key] = future
+
+        if not leader:
+            logger.debug(f"Coalescing request {coalesce_key[:12]}")
+            return future.result()
+
+        try:
+            result = self._call_with_retries(fn, args, kwargs, estimated_tokens, idempotent)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(coalesce_key, None)
+
+    def _call_with_retries(self, fn, args, kwargs, estimated_tokens: int, idempotent: bool = True) -> Any:
+        attempt = 0
+        while True:
+            self.request_bucket.acquire()
+            if estimated_tokens:
+                self.token_bucket.acquire(estimated_tokens)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                status = _status_code(e)
+                if attempt >= self.max_retries or not _is_retryable(e, status, idempotent):
+                    raise
+                delay = self._backoff_delay(e, attempt)
+                if status == 429:
+                    self._throttle()
+                logger.warning(f"LLM call failed ({status or type(e).__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            used = _usage_tokens(result)
+            if used and used > estimated_tokens:
+                self.token_bucket.debit(used - estimated_tokens)
+            self._recover()
+            return result
+
+    def _backoff_delay(self, error: Exception, attempt: int) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _throttle(self) -> None:
+        """Multiplicatively decrease the request rate after a 429."""
+        with self._lock:
+            self._current_rpm = max(1.0, self._current_rpm / 2)
+            self.request_bucket.set_rate(self._current_rpm / 60)
+        logger.info(f"Throttled, request rate lowered to {self._current_rpm:.1f}/min")
+
+    def _recover(self) -> None:
+        """Additively increase the request rate back towards the configured limit."""
+        if self._current_rpm >= self.requests_per_minute:
+            return
+        with self._lock:
+            self._current_rpm = min(self.requests_per_minute, self._current_rpm + 1)
+            self.request_bucket.set_rate(self._current_rpm / 60)
+
+    def close(self) -> None:
+        self.http_client.close()
+
+
+class PooledChatModel:
+    """Wraps a langchain chat model so `invoke` goes through an LLMClientPool."""
+
+    def __init__(self, llm, pool: LLMClientPool):
+        self.llm = llm
+        self.pool = pool
+
+    def invoke(self, input, **kwargs):
+        payload = _serialize(input)
+        return self.pool.call(
+            self.llm.invoke,
+            input,
+            coalesce_key=_request_key(payload, kwargs),
+            estimated_tokens=estimate_tokens(payload),
+            **kwargs,
+        )
+
+    def __getattr__(self, name: str):
+        return getattr(self.llm, name)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def _serialize(input: Any) -> str:
+    if isinstance(input, str):
+        return input
+    return json.dumps(input, default=lambda o: getattr(o, "content", str(o)), sort_keys=True)
+
+
+def _request_key(payload: str, kwargs: Dict[str, Any]) -> str:
+    raw = payload + json.dumps(kwargs, default=str, sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None and getattr(error, "response", None) is not None:
+        status = getattr(error.response, "status_code", None)
+    return status
+
+
+def _is_retryable(error: Exception, status: Optional[int], idempotent: bool = True) -> bool:
+    if not idempotent:
+        # Only a rejection or a connection that never opened proves nothing was created
+        if status is not None:
+            return status in NEVER_PROCESSED_STATUS_CODES
+        return isinstance(error, (httpx.ConnectError, ConnectionRefusedError)) or isinstance(
+            getattr(error, "__cause__", None), httpx.ConnectError
+        )
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    # Connection level failures (timeouts, resets) carry no status code
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError)) or (
+        type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+    )
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def _usage_tokens(result: Any) -> int:
+    usage = getattr(result, "usage_metadata", None)
+    if usage:
+        return usage.get("total_tokens", 0)
+    usage = getattr(result, "usage", None)
+    return getattr(usage, "total_tokens", 0) or 0
@@ -1,17 +1,19 @@
 import logging
-from langchain_openai import ChatOpenAI
-from assistant_manager import AssistantManager
+from typing import Optional
+from openai import AzureOpenAI
+from assistant_manager import AssistantManager, DEFAULT_SESSION
+from llm_pool import LLMClientPool
 
 logger = logging.getLogger(__name__)
 
 class LLMWrapper:
-    def __init__(self, client: AzureOpenAI):
+    def __init__(self, client: AzureOpenAI, pool: Optional[LLMClientPool] = None):
         self.client = client
-        self.assistant_manager = AssistantManager(client)
+        self.assistant_manager = AssistantManager(client, pool=pool)
         self._setup_assistants()
 
     def _setup_assistants(self):
-        """Initialize different assistants for various tasks."""
+        """Initialize different assistants for various tasks, reusing registered ones across restarts."""
         self.assistant_manager.create_assistant(
             "planner",
             "You are an AI assistant that creates detailed development plans for software projects."
@@ -38,14 +40,21 @@ class LLMWrapper:
             model="gpt-4-1106-preview"  # Replace this value with the deployment name for your model.
         )
 
-    def chat(self, prompt: str, system_message: str = None, assistant_name: str = "planner") -> str:
+    def chat(
+        self,
+        prompt: str,
+        system_message: str = None,
+        assistant_name: str = "planner",
+        session_id: str = DEFAULT_SESSION
+    ) -> str:
         """Enhanced chat method using assistants API."""
         try:
             instructions = system_message if system_message else None
             return self.assistant_manager.run_conversation(
                 assistant_name,
                 prompt,
-                instructions
+                instructions,
+                session_id=session_id
             )
         except Exception as e:
             logger.error(f"Error in chat: {str(e)}")
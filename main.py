@@ -1,29 +1,44 @@
 import logging
-from typing import Annotated, Dict, TypedDict, List
+from typing import Annotated, Any, Dict, TypedDict, List
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 from langchain_openai import AzureChatOpenAI
 import yaml
-from agents import PlannerAgent, ExecutorAgent, ReviewerAgent, RunnerAgent, MonitorAgent
+from agents import PlannerAgent, ExecutorAgent, ReviewerAgent, RunnerAgent, MonitorAgent, PrecheckAgent, SpeculativeFixer
+from agents.budget import BudgetGovernor, BudgetedLLM, can_replan
+from agents.memprofile import MemoryProfiler
+from agents.plan_index import PlanIndex
+from agents.prefetch import EnvironmentPrefetcher
+from agents.validation import ValidationEngine
+from agents.venv_pool import VenvPool
+from llm_pool import LLMClientPool
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+import argparse
 import getpass
 import os
-
-os.environ["AZURE_OPENAI_API_KEY"] = getpass.getpass("Azure OpenAI API key")
-os.environ["AZURE_OPENAI_ENDPOINT"] = getpass.getpass("Azure OpenAI endpoint")
+import uuid
 
 # AZURE_OPENAI_DEPLOYMENT_NAME = getpass.getpass("Azure OpenAI deployment name")
 
+# Number of candidate fixes explored in parallel for general code errors; 0 disables it
+SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", "0"))
+
 class AgentState(TypedDict):
     messages: Annotated[list, add_messages]
     plan: List[str]
     current_step: int
     status: str
-    errors: List[str]
+    errors: List[str]  # short messages inline, long logs as log store handles
+    last_run_output: str
+    precheck_errors: List[Dict]
+    recommendation: str
+    context: Dict
+    session_id: str
+    budget: Dict
     next: str
 
 def should_continue(state: AgentState) -> bool:
@@ -34,38 +49,107 @@ def monitoring_condition(state: AgentState) -> str:
     """
     Determines next step based on monitoring results:
     - If status is 'completed' -> END
+    - If the budget allows no further planner iteration -> budget (partial result, then END)
+    - If there is a general code error and speculation is enabled -> speculative
     - If there are errors -> back to planner
     """
     if state.get("status") == "completed" and not state.get("errors"):
         return END
+    if not can_replan(state):
+        return "budget"
+    if SPECULATIVE_CANDIDATES and state.get("recommendation") == "fix_code:general_error":
+        return "speculative"
+    return "planner"
+
+def speculative_condition(state: AgentState) -> str:
+    """Re-run the project with a promoted fix; otherwise fall back to the planner."""
+    if state.get("status") == "fix_applied":
+        return "runner"
+    if not can_replan(state):
+        return "budget"
     return "planner"
 
-def create_agent_graph(llm: AzureChatOpenAI):
+def planner_condition(state: AgentState) -> str:
+    """Stop when the governor refused to plan instead of executing the previous plan again."""
+    if state.get("status") == "budget_exhausted":
+        return "budget"
+    return "executor"
+
+def precheck_condition(state: AgentState) -> str:
+    """Skip the runner when the static pre-check already found errors."""
+    if state.get("precheck_errors"):
+        return "monitoring"
+    return "runner"
+
+def create_agent_graph(
+    llm: AzureChatOpenAI,
+    governor: BudgetGovernor = None,
+    venv_pool: VenvPool = None,
+    profiler: MemoryProfiler = None,
+    prefetcher: EnvironmentPrefetcher = None,
+    resources: List[Any] = None,
+):
+    """Build the agent graph; agents holding processes or threads are appended to `resources` for the caller to close."""
     from langgraph.checkpoint.memory import MemorySaver
     from langgraph.prebuilt import tools_condition
 
+    # Every LLM call and node is charged to the session's time/token/iteration budget
+    governor = governor or BudgetGovernor()
+    llm = BudgetedLLM(llm, governor)
+
     # Define agent nodes
-    planner = PlannerAgent(llm)
-    executor = ExecutorAgent(llm)
+    prefetcher = prefetcher or EnvironmentPrefetcher()
+    # Plans that succeeded are indexed by objective so similar objectives start from them
+    plan_index = PlanIndex()
+    planner = PlannerAgent(llm, prefetcher=prefetcher, plan_index=plan_index)
+    validation = ValidationEngine()
+    executor = ExecutorAgent(llm, venv_pool=venv_pool, prefetcher=prefetcher, validation=validation)
     reviewer = ReviewerAgent(llm)
+    precheck = PrecheckAgent()
+    if resources is not None:
+        resources.extend([precheck, validation])
     runner = RunnerAgent()
-    monitor = MonitorAgent(llm)
+    monitor = MonitorAgent(llm, plan_index=plan_index)
+    speculative = SpeculativeFixer(llm, candidates=SPECULATIVE_CANDIDATES)
+
+    def node(name, fn, **kwargs):
+        fn = governor.track(name, fn, **kwargs)
+        # The optional memory profiler wraps outermost so it also sees the state the governor adds
+        return profiler.track(name, fn) if profiler else fn
 
     # Create the graph
     workflow = StateGraph(AgentState)
 
     # Add agent nodes
-    workflow.add_node("planner", planner.run)
-    workflow.add_node("executor", executor.execute_plan)
-    workflow.add_node("reviewer", reviewer.review_and_refine)
-    workflow.add_node("runner", runner.run_main)
-    workflow.add_node("monitoring", monitor.run)
+    workflow.add_node("planner", node("planner", planner.run, counts_iteration=True))
+    workflow.add_node("executor", node("executor", executor.execute_plan))
+    workflow.add_node("reviewer", node("reviewer", reviewer.review_and_refine))
+    workflow.add_node("precheck", node("precheck", precheck.run))
+    workflow.add_node("runner", node("runner", runner.run_main))
+    workflow.add_node("monitoring", node("monitoring", monitor.run))
+    workflow.add_node("speculative", node("speculative", speculative.run))
+    workflow.add_node("budget", governor.finish)
 
     # Define graph edges with conditional routing
     workflow.add_edge(START, "planner")
-    workflow.add_edge("planner", "executor")
+    workflow.add_conditional_edges(
+        "planner",
+        planner_condition,
+        {
+            "budget": "budget",
+            "executor": "executor"
+        }
+    )
     workflow.add_edge("executor", "reviewer")
-    workflow.add_edge("reviewer", "runner")
+    workflow.add_edge("reviewer", "precheck")
+    workflow.add_conditional_edges(
+        "precheck",
+        precheck_condition,
+        {
+            "monitoring": "monitoring",
+            "runner": "runner"
+        }
+    )
     workflow.add_edge("runner", "monitoring")
     
     # Add conditional edge from monitoring
@@ -74,37 +158,113 @@ def create_agent_graph(llm: AzureChatOpenAI):
         monitoring_condition,
         {
             END: END,
+            "budget": "budget",
+            "speculative": "speculative",
+            "planner": "planner"
+        }
+    )
+    workflow.add_conditional_edges(
+        "speculative",
+        speculative_condition,
+        {
+            "runner": "runner",
+            "budget": "budget",
             "planner": "planner"
         }
     )
+    workflow.add_edge("budget", END)
 
     return workflow.compile()
 
-def stream_graph_updates(graph, user_input: str):
-    for event in graph.stream({"messages": [{"role": "user", "content": user_input}]}):
+def stream_graph_updates(graph, user_input: str, profiler: MemoryProfiler = None):
+    session_id = str(uuid.uuid4())
+    # The budget governor decides when to stop, so LangGraph's own step limit is set well above it
+    config = {"recursion_limit": 500}
+    initial_state = {"messages": [{"role": "user", "content": user_input}], "session_id": session_id, "errors": []}
+    for event in graph.stream(initial_state, config):
         for value in event.values():
-            print("Assistant:", value["messages"][-1].content)
+            # Agents append both message objects and plain role/content dicts
+            message = value["messages"][-1]
+            print("Assistant:", message["content"] if isinstance(message, dict) else message.content)
+    if profiler:
+        print(profiler.format_report(session_id))
+        profiler.end_session(session_id)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="CodeCraft assistant")
+    parser.add_argument("--serve", action="store_true", help="run as a long-lived multi-session server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="serve over this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=4, help="sessions run concurrently")
+    parser.add_argument("--queue", type=int, default=8, help="sessions waiting before requests are rejected")
+    parser.add_argument("--warm-venvs", type=int, default=2, help="pre-created virtual environments kept ready")
+    parser.add_argument(
+        "--memory-profile", action="store_true", help="track memory per node and state field sizes (also MEMORY_PROFILE=1)"
+    )
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
 
-    llm = AzureChatOpenAI(
+    # Asked for at start-up rather than on import, so the graph can be built without credentials
+    for name, prompt in (("AZURE_OPENAI_API_KEY", "Azure OpenAI API key"), ("AZURE_OPENAI_ENDPOINT", "Azure OpenAI endpoint")):
+        if not os.getenv(name):
+            os.environ[name] = getpass.getpass(prompt)
+
+    # Shared rate-limited client layer; all LLM calls go through it
+    pool = LLMClientPool.from_env()
+    llm = pool.chat_model(
         deployment_name="o1-preview", openai_api_version="2024-08-01-preview"
     )
 
+    profiler = MemoryProfiler.from_env() or (MemoryProfiler() if args.memory_profile else None)
+
+    if args.serve:
+        from server import AgentServer, serve
+
+        # One graph, client pool, cache set and venv pool shared by every session
+        governor = BudgetGovernor()
+        venv_pool = VenvPool(size=args.warm_venvs)
+        prefetcher = EnvironmentPrefetcher()
+        # Closed by the server on shutdown
+        resources = [pool]
+        try:
+            workflow = create_agent_graph(llm, governor, venv_pool, profiler, prefetcher, resources)
+            app = AgentServer(
+                workflow, governor, max_workers=args.workers, max_queue=args.queue, profiler=profiler, resources=resources
+            )
+            try:
+                serve(app, args.host, args.port, args.socket)
+            finally:
+                app.close()
+        finally:
+            # Warm and speculatively staged venvs would otherwise outlive the server
+            prefetcher.close()
+            venv_pool.close()
+        return
+
     # Create the workflow graph
-    workflow = create_agent_graph(llm)
+    prefetcher = EnvironmentPrefetcher()
+    resources = [pool]
+    workflow = create_agent_graph(llm, profiler=profiler, prefetcher=prefetcher, resources=resources)
 
     # Main loop to take human input from the console
-    while True:
-        try:
-            user_input = input("User: ")
-            if user_input.lower() in ["quit", "exit", "q"]:
-                print("Goodbye!")
-                break
-
-            stream_graph_updates(workflow, user_input)
-        except Exception as e:
-           return e
+    try:
+        while True:
+            try:
+                user_input = input("User: ")
+                if user_input.lower() in ["quit", "exit", "q"]:
+                    print("Goodbye!")
+                    break
+
+                stream_graph_updates(workflow, user_input, profiler)
+            except Exception as e:
+               return e
+    finally:
+        prefetcher.close()
+        for resource in resources:
+            resource.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,294 @@
+import json
+import logging
+import os
+import socketserver
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from agents.logstore import get_log_store
+from agents.workspace import close_indexes, release_indexes
+
+logger = logging.getLogger(__name__)
+
+class Session:
+    """One objective run through the graph; events are kept so late subscribers can replay them."""
+
+    def __init__(self, session_id: str, objective: str):
+        self.id = session_id
+        self.objective = objective
+        self.status = "queued"
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self.events: List[Dict[str, Any]] = []
+        self.condition = threading.Condition()
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        with self.condition:
+            self.events.append(event)
+            self.condition.notify_all()
+
+    def wait_events(self, start: int, timeout: float = 15.0) -> List[Dict[str, Any]]:
+        """Events from index `start` on, blocking until at least one exists or the run ended."""
+        with self.condition:
+            if len(self.events) <= start and self.finished is None:
+                self.condition.wait(timeout)
+            return self.events[start:]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.id,
+            "objective": self.objective,
+            "status": self.status,
+            "created": self.created,
+            "finished": self.finished,
+            "events": len(self.events),
+        }
+
+class AgentServer:
+    """
+    Runs many sessions against one compiled graph, so the LLM client pool,
+    agent caches and venv pool stay warm across requests. Sessions beyond
+    `max_workers + max_queue` are rejected rather than queued without bound.
+    """
+
+    def __init__(
+        self,
+        graph,
+        governor=None,
+        max_workers: int = 4,
+        max_queue: int = 8,
+        session_ttl: float = 3600,
+        workspace_root: str = "sessions",
+        profiler=None,
+        resources: Optional[List[Any]] = None,
+    ):
+        self.graph = graph
+        self.governor = governor
+        self.profiler = profiler
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="session")
+        self.slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self.session_ttl = session_ttl
+        self.workspace_root = workspace_root
+        self.resources = resources or []  # shared objects with a close() method, released on shutdown
+        self.sessions: Dict[str, Session] = {}
+        self.lock = threading.Lock()
+
+    def submit(self, objective: str) -> Optional[Session]:
+        """Start a session, or return None when the server is saturated."""
+        if not self.slots.acquire(blocking=False):
+            return None
+        self._prune()
+        session = Session(str(uuid.uuid4()), objective)
+        with self.lock:
+            self.sessions[session.id] = session
+        self.executor.submit(self._run, session)
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self.lock:
+            return self.sessions.get(session_id)
+
+    def remove(self, session_id: str) -> bool:
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session:
+            release_indexes(self._workspace(session))
+        if session and self.governor:
+            self.governor.end_session(session_id)
+        if session and self.profiler:
+            self.profiler.end_session(session_id)
+        return session is not None
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            statuses = [session.status for session in self.sessions.values()]
+        return {
+            "sessions": len(statuses),
+            "running": statuses.count("running"),
+            "queued": statuses.count("queued"),
+        }
+
+    def close(self) -> None:
+        """Stop accepting work and release what the sessions held."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        close_indexes()
+        for resource in self.resources:
+            try:
+                resource.close()
+            except Exception as e:
+                logger.warning(f"Could not close {type(resource).__name__}: {e}")
+
+    def _workspace(self, session: Session) -> str:
+        # Each session plans inside its own directory so concurrent projects don't collide.
+        # Absolute, because its commands run with the workspace as their cwd
+        return os.path.abspath(os.path.join(self.workspace_root, session.id))
+
+    def _run(self, session: Session) -> None:
+        session.status = "running"
+        workspace = self._workspace(session)
+        initial_state = {
+            "messages": [{"role": "user", "content": session.objective}],
+            "session_id": session.id,
+            "context": {"workspace_root": workspace},
+            "errors": [],
+        }
+        last_status = None
+        try:
+            for event in self.graph.stream(initial_state, {"recursion_limit": 500}):
+                for node, value in event.items():
+                    session.publish(_node_event(node, value))
+                    if value and value.get("status"):
+                        last_status = value["status"]
+            session.status = last_status or "done"
+        except Exception as e:
+            logger.error(f"Session {session.id} failed: {e}")
+            session.status = "failed"
+            session.publish({"node": None, "error": str(e)})
+        finally:
+            # Nothing reads the session's files any more; free their inotify instances
+            release_indexes(workspace)
+            session.finished = time.time()
+            session.publish({"node": None, "status": session.status, "end": True})
+            self.slots.release()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.session_ttl
+        with self.lock:
+            expired = [s.id for s in self.sessions.values() if s.finished and s.finished < cutoff]
+        for session_id in expired:
+            self.remove(session_id)
+
+def _node_event(node: str, value: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """A compact per-node update; the full state never goes over the wire."""
+    event: Dict[str, Any] = {"node": node}
+    if not value:
+        return event
+    event["status"] = value.get("status")
+    messages = value.get("messages") or []
+    if messages:
+        message = messages[-1]
+        event["message"] = message["content"] if isinstance(message, dict) else message.content
+    if value.get("errors"):
+        event["error"] = get_log_store().tail(value["errors"][-1], 2000)
+    if value.get("budget"):
+        event["budget"] = value["budget"]
+    return event
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "CodeCraftServer/0.1"
+
+    @property
+    def app(self) -> AgentServer:
+        return self.server.app
+
+    def address_string(self) -> str:
+        # Unix-socket peers have no (host, port) address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _parts(self) -> List[str]:
+        return [part for part in self.path.split("?")[0].split("/") if part]
+
+    def do_GET(self) -> None:
+        parts = self._parts()
+        if parts == ["health"]:
+            return self._send_json(200, {"ok": True, **self.app.stats()})
+        if parts == ["memory"]:
+            if not self.app.profiler:
+                return self._send_json(404, {"error": "memory profiling is not enabled"})
+            return self._send_json(200, self.app.profiler.report())
+        if len(parts) >= 2 and parts[0] == "sessions":
+            session = self.app.get(parts[1])
+            if not session:
+                return self._send_json(404, {"error": "unknown session"})
+            if len(parts) == 2:
+                return self._send_json(200, {**session.summary(), "last_event": (session.events or [None])[-1]})
+            if parts[2] == "events":
+                return self._stream_events(session)
+        self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        if self._parts() != ["sessions"]:
+            return self._send_json(404, {"error": "not found"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            objective = body["objective"]
+        except (ValueError, KeyError):
+            return self._send_json(400, {"error": "expected JSON body with an 'objective'"})
+
+        session = self.app.submit(objective)
+        if session is None:
+            return self._send_json(503, {"error": "server saturated, retry later"}, {"Retry-After": "5"})
+        self._send_json(202, session.summary(), {"Location": f"/sessions/{session.id}"})
+
+    def do_DELETE(self) -> None:
+        parts = self._parts()
+        if len(parts) == 2 and parts[0] == "sessions" and self.app.remove(parts[1]):
+            return self._send_json(200, {"deleted": parts[1]})
+        self._send_json(404, {"error": "unknown session"})
+
+    def _stream_events(self, session: Session) -> None:
+        """Stream node updates as NDJSON over a chunked response until the session ends."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        sent = 0
+        try:
+            while True:
+                events = session.wait_events(sent)
+                for event in events:
+                    line = (json.dumps(event) + "\n").encode()
+                    self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+                sent += len(events)
+                if events and events[-1].get("end"):
+                    break
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug(f"Event subscriber for {session.id} disconnected")
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(
+    app: AgentServer,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    unix_socket: Optional[str] = None,
+) -> None:
+    """Serve the API over a Unix socket when one is given, otherwise over local TCP."""
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        httpd = _UnixHTTPServer(unix_socket, _Handler)
+        where = unix_socket
+    else:
+        httpd = ThreadingHTTPServer((host, port), _Handler)
+        httpd.daemon_threads = True
+        where = f"http://{host}:{httpd.server_port}"
+    httpd.app = app
+    logger.info(f"Serving agent graph on {where}")
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        if unix_socket and os.path.exists(unix_socket):
+            os.unlink(unix_socket)
@@ -0,0 +1,56 @@
+import json
+import os
+import tempfile
+import types
+
+import pytest
+
+# The stores are process-wide singletons configured from the environment, so point them
+# at a scratch directory before any test module imports the agents
+_scratch = tempfile.mkdtemp(prefix="codecraft-tests-")
+for _name in ("LOG_STORE_PATH", "BLOB_STORE_PATH", "WHEEL_CACHE_PATH"):
+    os.environ[_name] = os.path.join(_scratch, _name.lower())
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.invalid")
+
+HELLO_PLAN = {
+    "objective": "print hello",
+    "actions": [
+        {"type": "create_directory", "params": {"path": "proj"}, "description": "Create the project directory", "dependencies": []},
+        {
+            "type": "create_file",
+            "params": {"path": "proj/main.py", "content": "print('hello')\n"},
+            "description": "Write main.py",
+            "dependencies": [],
+        },
+    ],
+    "context": {},
+    "dependencies": [],
+    "estimated_time": "1 minute",
+    "requirements": [],
+}
+
+class FakeLLM:
+    """Answers planning prompts with a fixed plan and every other prompt with a bland review."""
+
+    def __init__(self, plan=None):
+        self.plan = plan or HELLO_PLAN
+        self.planning_calls = 0
+
+    def invoke(self, messages, **kwargs):
+        prompt = messages[-1]["content"] if isinstance(messages, list) and isinstance(messages[-1], dict) else str(messages)
+        if "software development planner" in prompt:
+            self.planning_calls += 1
+            return types.SimpleNamespace(content=json.dumps(self.plan), usage_metadata=None)
+        return types.SimpleNamespace(content="Looks good.", usage_metadata=None)
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory with a private plan index."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PLAN_INDEX_PATH", str(tmp_path / "plan_index.json"))
+    return tmp_path
+
+@pytest.fixture
+def fake_llm():
+    return FakeLLM()
@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+from agents.executor import ExecutorAgent
+
+def test_commands_run_in_the_session_workspace(workdir):
+    workspace = workdir / "sessions" / "s1"
+    executor = ExecutorAgent(llm=None)
+    executor._handle_run_command({"command": "echo hi > out.txt"}, {"workspace_root": str(workspace)})
+    assert (workspace / "out.txt").read_text().strip() == "hi"
+    assert not (workdir / "out.txt").exists()
+
+def test_dependencies_install_into_the_session_venv(workdir, monkeypatch):
+    subprocess.run([sys.executable, "-m", "venv", "--without-pip", "proj/venv"], check=True)
+    calls = []
+    monkeypatch.setattr(subprocess, "run", lambda command, **kwargs: calls.append((command, kwargs)))
+
+    executor = ExecutorAgent(llm=None)
+    executor._handle_install_deps({"packages": ["requests"]}, {"venv_path": "proj/venv", "workspace_root": str(workdir)})
+
+    command, kwargs = calls[0]
+    assert command[0] == os.path.abspath("proj/venv/bin/python")
+    assert command[1:4] == ["-m", "pip", "install"] and command[-1] == "requests"
+    assert kwargs["cwd"] == str(workdir)
@@ -0,0 +1,73 @@
+from langgraph.graph import END
+
+import main
+from conftest import HELLO_PLAN, FakeLLM
+from agents.budget import BudgetGovernor, BudgetLimits
+
+ONE_CYCLE = ["planner", "executor", "reviewer", "precheck", "runner", "monitoring"]
+
+def run_graph(graph, objective="print hello", session_id="s1"):
+    nodes, final = [], None
+    initial_state = {"messages": [{"role": "user", "content": objective}], "session_id": session_id, "errors": []}
+    for event in graph.stream(initial_state, {"recursion_limit": 100}):
+        for node, value in event.items():
+            nodes.append(node)
+            final = value
+    return nodes, final
+
+def test_passing_program_completes_in_one_cycle(workdir, fake_llm):
+    graph = main.create_agent_graph(fake_llm, BudgetGovernor(BudgetLimits(max_iterations=4)))
+    nodes, final = run_graph(graph)
+    assert nodes == ONE_CYCLE
+    assert final["status"] == "completed"
+    assert final["errors"] == []
+    assert fake_llm.planning_calls == 1
+
+def test_monitor_routes_to_end_on_success():
+    assert main.monitoring_condition({"status": "completed", "errors": []}) == END
+
+FAILING_PLAN = {
+    **HELLO_PLAN,
+    "actions": [
+        HELLO_PLAN["actions"][0],
+        {
+            "type": "create_file",
+            "params": {"path": "proj/main.py", "content": "raise SystemExit('error: always fails')\n"},
+            "description": "Write main.py",
+            "dependencies": [],
+        },
+    ],
+}
+
+def test_iteration_budget_allows_exactly_max_iterations_plans(workdir):
+    llm = FakeLLM(FAILING_PLAN)
+    graph = main.create_agent_graph(llm, BudgetGovernor(BudgetLimits(max_iterations=3)))
+    nodes, final = run_graph(graph)
+    assert llm.planning_calls == 3
+    assert nodes.count("planner") == 3
+    assert nodes[-2:] == ["monitoring", "budget"]
+    assert final["status"] == "budget_exhausted"
+    assert "BudgetExceededError" not in final["messages"][-1].content
+
+def test_refused_planner_call_goes_straight_to_budget(workdir, fake_llm):
+    governor = BudgetGovernor(BudgetLimits(max_tokens=5))
+    governor.record_tokens(10, "s1")
+    graph = main.create_agent_graph(fake_llm, governor)
+    nodes, final = run_graph(graph)
+    assert nodes == ["planner", "budget"]
+    assert fake_llm.planning_calls == 0
+    assert final["status"] == "budget_exhausted"
+    assert final["errors"] == []
+
+def test_successful_plan_is_indexed_and_reused(workdir):
+    first = FakeLLM()
+    _, final = run_graph(main.create_agent_graph(first, BudgetGovernor(BudgetLimits(max_iterations=4))))
+    assert final["status"] == "completed"
+    assert (workdir / "plan_index.json").is_file()
+
+    # A fresh graph loads the index from disk, as a restarted process would
+    second = FakeLLM()
+    nodes, final = run_graph(main.create_agent_graph(second, BudgetGovernor(BudgetLimits(max_iterations=4))), session_id="s2")
+    assert nodes == ONE_CYCLE
+    assert final["status"] == "completed"
+    assert second.planning_calls == 0
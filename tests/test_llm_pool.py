@@ -0,0 +1,45 @@
+import httpx
+import pytest
+
+from llm_pool import LLMClientPool
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+def failing(*errors):
+    """A callable that raises each error in turn, then returns "ok"; counts its calls."""
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return "ok"
+
+    return fn, calls
+
+@pytest.fixture
+def pool():
+    pool = LLMClientPool(requests_per_minute=6000, max_retries=3, base_delay=0.0)
+    yield pool
+    pool.close()
+
+def test_idempotent_call_is_retried_after_timeout_and_server_error(pool):
+    fn, calls = failing(httpx.ReadTimeout("timed out"), StatusError(503))
+    assert pool.call(fn) == "ok"
+    assert len(calls) == 3
+
+@pytest.mark.parametrize("error", [httpx.ReadTimeout("timed out"), StatusError(500), StatusError(409)])
+def test_non_idempotent_call_is_not_retried_when_it_may_have_been_processed(pool, error):
+    fn, calls = failing(error)
+    with pytest.raises(type(error)):
+        pool.call(fn, idempotent=False)
+    assert len(calls) == 1
+
+@pytest.mark.parametrize("error", [httpx.ConnectError("refused"), StatusError(429)])
+def test_non_idempotent_call_is_retried_when_nothing_reached_the_server(pool, error):
+    fn, calls = failing(error)
+    assert pool.call(fn, idempotent=False) == "ok"
+    assert len(calls) == 2
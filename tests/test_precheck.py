@@ -0,0 +1,49 @@
+from agents.precheck import check_source
+
+MODULES = frozenset({"json", "typing", "os"})
+
+def names(errors, error_type):
+    return [error["name"] for error in errors if error["type"] == error_type]
+
+def test_import_with_import_error_fallback_is_not_reported():
+    source = (
+        "try:\n"
+        "    import ujson as json\n"
+        "except ImportError:\n"
+        "    import json\n"
+        "try:\n"
+        "    from fastjson import loads\n"
+        "except (ValueError, ModuleNotFoundError):\n"
+        "    loads = json.loads\n"
+    )
+    assert check_source("main.py", source, MODULES) == []
+
+def test_type_checking_imports_are_not_reported():
+    source = (
+        "import typing\n"
+        "from typing import TYPE_CHECKING\n"
+        "if TYPE_CHECKING:\n"
+        "    from numpy import ndarray\n"
+        "if typing.TYPE_CHECKING:\n"
+        "    import pandas\n"
+    )
+    assert check_source("main.py", source, MODULES) == []
+
+def test_unguarded_and_wrongly_guarded_imports_are_reported():
+    source = (
+        "import missing_one\n"
+        "try:\n"
+        "    import missing_two\n"
+        "except KeyError:\n"
+        "    pass\n"
+    )
+    assert names(check_source("main.py", source, MODULES), "unresolved_import") == ["missing_one", "missing_two"]
+
+def test_implicit_class_names_are_bound():
+    source = (
+        "class Point:\n"
+        "    label = __qualname__ + __module__\n"
+        "    def kind(self):\n"
+        "        return __class__.__name__\n"
+    )
+    assert names(check_source("main.py", source, MODULES), "undefined_name") == []
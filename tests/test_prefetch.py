@@ -0,0 +1,27 @@
+import sys
+import time
+
+from agents.prefetch import EnvironmentPrefetcher
+
+def staged_dirs(directory):
+    return [path for path in directory.iterdir() if path.name.startswith(".venv.prefetch-")]
+
+def test_close_discards_unclaimed_staged_venv(workdir):
+    prefetcher = EnvironmentPrefetcher(wheel_dir=str(workdir / "wheels"), python=sys.executable)
+    job = prefetcher.start("print hello", {"workspace_root": str(workdir)})
+    assert job.venv_target is None
+    deadline = time.time() + 10
+    while not staged_dirs(workdir) and time.time() < deadline:
+        time.sleep(0.01)
+
+    prefetcher.close()
+    assert staged_dirs(workdir) == []
+    assert prefetcher.start("print hello", {"workspace_root": str(workdir)}).venv_ready.is_set()
+    assert staged_dirs(workdir) == []
+
+def test_no_venv_is_staged_when_the_known_venv_exists(workdir):
+    (workdir / "venv").mkdir()
+    prefetcher = EnvironmentPrefetcher(wheel_dir=str(workdir / "wheels"), python=sys.executable)
+    prefetcher.start("print hello", {"workspace_root": str(workdir), "venv_path": str(workdir / "venv")})
+    assert prefetcher.staged == []
+    prefetcher.close()
@@ -0,0 +1,44 @@
+import time
+
+import main
+from agents.budget import BudgetGovernor, BudgetLimits
+from server import AgentServer
+
+def wait_for(session, timeout=30.0):
+    deadline = time.time() + timeout
+    while session.finished is None and time.time() < deadline:
+        session.wait_events(len(session.events), timeout=0.5)
+    assert session.finished is not None, "session did not finish"
+
+def test_working_program_session_completes(workdir, fake_llm):
+    governor = BudgetGovernor(BudgetLimits(max_iterations=4))
+    app = AgentServer(main.create_agent_graph(fake_llm, governor), governor, workspace_root=str(workdir / "sessions"))
+    session = app.submit("print hello")
+    wait_for(session)
+    assert session.status == "completed"
+    assert session.events[-1] == {"node": None, "status": "completed", "end": True}
+    assert fake_llm.planning_calls == 1
+    assert (workdir / "sessions" / session.id / "proj" / "main.py").is_file()
+
+def test_finished_session_releases_its_workspace_indexes(workdir, fake_llm):
+    from agents import workspace
+
+    governor = BudgetGovernor(BudgetLimits(max_iterations=4))
+    app = AgentServer(main.create_agent_graph(fake_llm, governor), governor, workspace_root=str(workdir / "sessions"))
+    session = app.submit("print hello")
+    wait_for(session)
+    session_root = (workdir / "sessions" / session.id).resolve()
+    assert not [root for root in workspace._indexes if session_root in root.parents or root == session_root]
+    app.close()
+
+def test_close_releases_shared_resources(fake_llm):
+    class Resource:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    resources = [Resource(), Resource()]
+    app = AgentServer(main.create_agent_graph(fake_llm), resources=resources)
+    app.close()
+    assert all(resource.closed for resource in resources)
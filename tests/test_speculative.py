@@ -0,0 +1,27 @@
+import subprocess
+import sys
+
+from agents.patching import parse_edits
+from agents.speculative import SpeculativeFixer
+
+FIX = """main.py
+<<<<<<< SEARCH
+print(undefined_name)
+=======
+print("fixed")
+>>>>>>> REPLACE
+"""
+
+def test_candidate_runs_with_relative_venv_path(workdir):
+    project = workdir / "proj"
+    project.mkdir()
+    (project / "main.py").write_text("print(undefined_name)\n")
+    (project / "test_main.py").write_text("def test_nothing():\n    pass\n")
+    subprocess.run([sys.executable, "-m", "venv", "--without-pip", str(project / "venv")], check=True)
+
+    fixer = SpeculativeFixer(llm=None, candidates=1)
+    context = {"venv_path": "proj/venv", "last_created_dir": "proj"}
+    changed, edits = fixer._evaluate_all([parse_edits(FIX)], "proj", context)
+
+    assert changed == {"main.py": 'print("fixed")\n'}
+    assert (project / "main.py").read_text() == "print(undefined_name)\n"
@@ -0,0 +1,25 @@
+from agents import workspace
+from agents.workspace import find_index, get_index, release_indexes
+
+def test_release_closes_indexes_below_a_directory(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    index_a, index_b = get_index(tmp_path / "a"), get_index(tmp_path / "b")
+    assert find_index(tmp_path / "a" / "main.py") is index_a
+
+    assert release_indexes(tmp_path) == 2
+    assert find_index(tmp_path / "a" / "main.py") is None
+    assert index_a.mode == "stat-walk" and index_b.mode == "stat-walk"
+
+def test_least_recently_used_index_is_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(workspace, "MAX_INDEXES", 2)
+    for name in ("a", "b", "c"):
+        (tmp_path / name).mkdir()
+    first = get_index(tmp_path / "a")
+    get_index(tmp_path / "b")
+    get_index(tmp_path / "a")  # a is now more recent than b
+    get_index(tmp_path / "c")
+
+    assert find_index(tmp_path / "a") is first
+    assert find_index(tmp_path / "b") is None
+    release_indexes(tmp_path)